@@ -1,15 +1,65 @@
 from .flight_models import *
 from sqlalchemy.orm import Session
+from sqlalchemy import select, func
 from typing import List, Dict
 from datetime import datetime
+from contextlib import contextmanager
+import pytz
 
 
 
 class AuditManager:
+    BUFFER_KEY = 'audit_buffer'
+
+    @staticmethod
+    @contextmanager
+    def batch(db: Session):
+        """Buffers audit entries written on this session and inserts them in one flush and one commit on exit.
+
+        Entries keep the order and timestamps they were recorded with. Nested batches join the outer one.
+        """
+        if db.info.get(AuditManager.BUFFER_KEY) is not None:
+            yield
+            return
+
+        db.info[AuditManager.BUFFER_KEY] = []
+        try:
+            yield
+            AuditManager.flush(db)
+        finally:
+            # Whether the block or the flush failed, later record() calls must not buffer into a dead batch
+            db.info.pop(AuditManager.BUFFER_KEY, None)
+
+    @staticmethod
+    def flush(db: Session) -> None:
+        entries = db.info.pop(AuditManager.BUFFER_KEY, None)
+        if entries:
+            db.add_all(entries)
+            db.commit()
+
+    @staticmethod
+    def record(db: Session, entry: AuditEntry) -> None:
+        buffer = db.info.get(AuditManager.BUFFER_KEY)
+        if buffer is None:
+            db.add(entry)
+            db.commit()
+            return
+        if entry.timestamp is None:
+            # Stamp now, as the column default would have at an immediate commit
+            entry.timestamp = datetime.now(pytz.timezone('US/Central'))
+        buffer.append(entry)
+
     @staticmethod
     def clear_and_add_audit_entries(db: Session, inspection: Inspection, flight_requirements: Dict[str, List[str]], timestamp: datetime) -> None:
         db.query(AuditEntry).filter_by(inspection_id=inspection.inspection_id).delete()
-        db.commit()
+        buffer = db.info.get(AuditManager.BUFFER_KEY)
+        if buffer is not None:
+            # Buffered entries would already have been committed, and deleted above
+            buffer[:] = [entry for entry in buffer if entry.inspection_id != inspection.inspection_id]
+            # Flight IDs used by the entries below must exist even without the commit
+            db.flush()
+        else:
+            db.commit()
 
         AuditManager.add_audit_entry(db, inspection.inspection_id, inspection.sites[0].site_id, "System", "Initial Review", {"status": "Started"}, inspection.created_at)
 
@@ -27,6 +77,85 @@ class AuditManager:
 
         db.commit()
 
+    @staticmethod
+    def latest_audit_state(db: Session, inspection_id: str):
+        """Last recorded flight results per (site, flight name) and last check entries per (site, action)."""
+        latest_flight_ids = (select(func.max(AuditEntry.audit_id))
+                             .where(AuditEntry.inspection_id == inspection_id, AuditEntry.flight_name.isnot(None))
+                             .group_by(AuditEntry.site_id, AuditEntry.flight_name))
+        flight_state = {(entry.site_id, entry.flight_name): entry.result
+                        for entry in db.query(AuditEntry).filter(AuditEntry.audit_id.in_(latest_flight_ids))}
+
+        latest_check_ids = (select(func.max(AuditEntry.audit_id))
+                            .where(AuditEntry.inspection_id == inspection_id, AuditEntry.action.in_(("Scope Check", "Inspection Check")))
+                            .group_by(AuditEntry.site_id, AuditEntry.action))
+        check_state = {(entry.site_id, entry.action): entry
+                       for entry in db.query(AuditEntry).filter(AuditEntry.audit_id.in_(latest_check_ids))}
+        return flight_state, check_state
+
+    @staticmethod
+    def add_audit_transitions(db: Session, inspection: Inspection, flight_requirements: Dict[str, List[str]], timestamp: datetime) -> None:
+        """Appends entries only for flight and scope state that changed since the last recorded state.
+
+        The trail is never rewritten, so the cost of an upload follows what it changed rather
+        than the inspection's history.
+        """
+        inspection_id = inspection.inspection_id
+        flight_state, check_state = AuditManager.latest_audit_state(db, inspection_id)
+        buffer = db.info.get(AuditManager.BUFFER_KEY) or []
+        has_history = (bool(flight_state or check_state)
+                       or any(entry.inspection_id == inspection_id for entry in buffer)
+                       or db.query(AuditEntry.audit_id).filter_by(inspection_id=inspection_id).first() is not None)
+        if not has_history:
+            AuditManager.add_audit_entry(db, inspection_id, inspection.sites[0].site_id, "System", "Initial Review", {"status": "Started"}, inspection.created_at)
+
+        for site_inspection in inspection.sites:
+            site_id = site_inspection.site_id
+            site_inspection.initiate_inspection()
+            changed = False
+
+            for flight in site_inspection.flights:
+                result = flight.status.value
+                previous_result = flight_state.get((site_id, flight.flight_name))
+                if (site_id, flight.flight_name) not in flight_state:
+                    AuditManager.add_flight_audit_entry(db, inspection_id, site_id, flight, flight.created_at)
+                elif previous_result != result:
+                    pilot_name = flight.pilot_name or "System" if flight.pilot_name == "Unknown Pilot" else flight.pilot_name
+                    AuditManager.record(db, AuditEntry.create_flight_status_entry(
+                        inspection_id, site_id, flight.flight_id, pilot_name, flight.flight_name, previous_result, result, timestamp))
+                else:
+                    continue
+                flight_state[(site_id, flight.flight_name)] = result
+                changed = True
+
+            site_inspection.complete_inspection()
+
+            scope_entry = AuditEntry.create_scope_check_entry(
+                inspection_id=inspection_id,
+                site_id=site_id,
+                required_flights=flight_requirements.get(site_inspection.scope_requirement, []),
+                captured_flights=[flight.flight_name for flight in site_inspection.flights],
+                result=site_inspection.scope_status.value,
+                timestamp=timestamp
+            )
+            inspection_entry = AuditEntry.create_inspection_check_entry(
+                inspection_id=inspection_id,
+                site_id=site_id,
+                result="Completed" if site_inspection.status == InspectionStatus.COMPLETED else "In Progress",
+                timestamp=timestamp
+            )
+            for entry in (scope_entry, inspection_entry):
+                previous = check_state.get((site_id, entry.action))
+                if previous is None or previous.details != entry.details:
+                    AuditManager.record(db, entry)
+                    changed = True
+
+            if changed:
+                AuditManager.add_audit_entry(db, inspection_id, site_id, "Pilot", "Inspection Committed", {}, timestamp)
+
+        if db.info.get(AuditManager.BUFFER_KEY) is None:
+            db.commit()
+
     @staticmethod
     def add_audit_entry(db, inspection_id, site_id, user, action, details, timestamp):
         entry = AuditEntry(
@@ -37,8 +166,7 @@ class AuditManager:
             details=details,
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_flight_audit_entry(db, inspection_id, site_id, flight, timestamp):
@@ -52,8 +180,7 @@ class AuditManager:
             result=flight.status.value,
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_scope_check_audit_entry(db, inspection_id, site_inspection, flight_requirements, timestamp):
@@ -68,8 +195,7 @@ class AuditManager:
             result=result,
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_inspection_check_audit_entry(db, inspection_id, site_inspection, timestamp):
@@ -80,8 +206,7 @@ class AuditManager:
             result=result,
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
 
     @staticmethod
@@ -96,8 +221,7 @@ class AuditManager:
             },
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
 
     @staticmethod
@@ -114,32 +238,27 @@ class AuditManager:
             },
             timestamp=timestamp
         )
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_override_request_entry(db, inspection_id, site_id, flight_id, user, details, timestamp):
         entry = AuditEntry.create_override_request_entry(inspection_id, site_id, flight_id, user, details, timestamp)
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_override_approval_entry(db, inspection_id, site_id, flight_id, user, details, timestamp):
         entry = AuditEntry.create_override_approval_entry(inspection_id, site_id, flight_id, user, details, timestamp)
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_override_denial_entry(db, inspection_id, site_id, flight_id, user, details, timestamp):
         entry = AuditEntry.create_override_denial_entry(inspection_id, site_id, flight_id, user, details, timestamp)
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_photo_addition_entry(db, inspection_id, site_id, flight_id, user, details, timestamp):
         entry = AuditEntry.create_photo_addition_entry(inspection_id, site_id, flight_id, user, details, timestamp)
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
     @staticmethod
     def add_photo_addition_entry(db, inspection_id, site_id, flight_id, user, photos, timestamp):
@@ -148,6 +267,5 @@ class AuditManager:
             "photo_names": [photo.filename for photo in photos]
         }
         entry = AuditEntry.create_photo_addition_entry(inspection_id, site_id, flight_id, user, details, timestamp)
-        db.add(entry)
-        db.commit()
+        AuditManager.record(db, entry)
 
@@ -0,0 +1,126 @@
+import os
+import io
+import json
+import math
+import glob
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+from .thumbnail_cache import ThumbnailCache
+
+CONTACT_SHEET_SIZES = (150, 300)
+CONTACT_SHEET_FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+WEBP_MAX_DIMENSION = 16383
+
+
+class ContactSheetBuilder:
+    """One tiled image of a flight's thumbnails in capture order, plus a JSON index of where each tile is.
+
+    Sheets are stored on disk under a digest of the flight's ordered photo identifiers, so a sheet is
+    rebuilt only after the flight's photo set changes. The digest is also part of the ETag.
+    """
+
+    _default: Optional['ContactSheetBuilder'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, directory: str, thumbnail_cache: ThumbnailCache):
+        self.directory = directory
+        self.thumbnail_cache = thumbnail_cache
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def default(cls) -> 'ContactSheetBuilder':
+        """The process-wide builder, storing sheets in CONTACT_SHEET_DIR."""
+        with cls._default_lock:
+            if cls._default is None:
+                directory = os.getenv('CONTACT_SHEET_DIR', os.path.join(tempfile.gettempdir(), 'spotcheck_contact_sheets'))
+                cls._default = cls(directory, ThumbnailCache.default())
+            return cls._default
+
+    @staticmethod
+    def digest(photos: List[Tuple[str, Optional[str]]]) -> str:
+        key = json.dumps([unique_identifier for unique_identifier, _ in photos])
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def paths(self, flight_id: int, digest: str, size: int, image_format: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"flight_{flight_id}_{digest}_{size}_{image_format}")
+        return f"{base}.{image_format}", f"{base}.json"
+
+    def get_or_build(self, flight_id: int, photos: List[Tuple[str, Optional[str]]], size: int, image_format: str) -> Tuple[str, Dict[str, Any]]:
+        """Returns (image path, tile index) for photos given as (unique_identifier, source_path) in capture order."""
+        digest = self.digest(photos)
+        image_path, index_path = self.paths(flight_id, digest, size, image_format)
+        try:
+            with open(index_path) as f:
+                return image_path, json.load(f)
+        except FileNotFoundError:
+            pass
+
+        with self.lock:
+            if not os.path.exists(index_path):
+                self.build(flight_id, photos, size, image_format, digest)
+        with open(index_path) as f:
+            return image_path, json.load(f)
+
+    def thumbnail_paths(self, photos: List[Tuple[str, Optional[str]]], size: int) -> Dict[str, str]:
+        cached = {unique_identifier: self.thumbnail_cache.get(unique_identifier, size) for unique_identifier, _ in photos}
+        missing = [(unique_identifier, source_path) for unique_identifier, source_path in photos if cached[unique_identifier] is None]
+        if missing:
+            self.thumbnail_cache.pregenerate(missing, [size])
+            for unique_identifier, _ in missing:
+                cached[unique_identifier] = self.thumbnail_cache.get(unique_identifier, size)
+        return {unique_identifier: path for unique_identifier, path in cached.items() if path is not None}
+
+    def build(self, flight_id: int, photos: List[Tuple[str, Optional[str]]], size: int, image_format: str, digest: str) -> None:
+        thumbnail_paths = self.thumbnail_paths(photos, size)
+        available = [unique_identifier for unique_identifier, _ in photos if unique_identifier in thumbnail_paths]
+        columns = max(1, math.ceil(math.sqrt(len(available))))
+        rows = max(1, math.ceil(len(available) / columns))
+        if image_format == 'webp' and max(columns, rows) * size > WEBP_MAX_DIMENSION:
+            raise ValueError(f"Flight {flight_id} has too many photos for a WebP contact sheet at size {size}")
+
+        sheet = Image.new('RGB', (columns * size, rows * size), (0, 0, 0))
+        tiles = []
+        for position, unique_identifier in enumerate(available):
+            with Image.open(thumbnail_paths[unique_identifier]) as thumbnail:
+                # Centered in its cell; thumbnails keep their aspect ratio within size x size
+                x = (position % columns) * size + (size - thumbnail.width) // 2
+                y = (position // columns) * size + (size - thumbnail.height) // 2
+                sheet.paste(thumbnail, (x, y))
+                tiles.append({'unique_identifier': unique_identifier, 'x': x, 'y': y, 'width': thumbnail.width, 'height': thumbnail.height})
+
+        index = {
+            'flight_id': flight_id,
+            'etag': f"{digest}-{size}-{image_format}",
+            'tile_size': size,
+            'columns': columns,
+            'rows': rows,
+            'width': sheet.width,
+            'height': sheet.height,
+            'tiles': tiles,
+            'missing': [unique_identifier for unique_identifier, _ in photos if unique_identifier not in thumbnail_paths]
+        }
+
+        image_path, index_path = self.paths(flight_id, digest, size, image_format)
+        output = io.BytesIO()
+        sheet.save(output, format=CONTACT_SHEET_FORMATS[image_format][0], quality=85)
+        self.write(image_path, output.getvalue())
+        # The index is written last: its presence marks the sheet as complete
+        self.write(index_path, json.dumps(index).encode())
+
+        # Sheets built for an earlier photo set of this flight are stale now
+        for stale_path in glob.glob(os.path.join(self.directory, f"flight_{flight_id}_*")):
+            if not stale_path.startswith(os.path.join(self.directory, f"flight_{flight_id}_{digest}")):
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
+
+    def write(self, path: str, data: bytes) -> None:
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(temp_fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
@@ -1,30 +1,102 @@
-from google.cloud import storage
 from google.api_core import exceptions
 import os
+import atexit
 import tempfile
-from sqlalchemy import create_engine
+from contextlib import nullcontext
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool, QueuePool
 from contextlib import contextmanager
 from .flight_models import Base
+from .migrations import run_migrations, stamp
+from .db_sync import DatabaseSyncEngine, GCSStorageBackend, LocalStorageBackend
+
+# SQLite connection settings, applied to every new connection; pick one with DB_ENGINE_PROFILE
+ENGINE_PROFILES = {
+    # Several gunicorn workers on one file: readers never block the writer
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size_kib': 64 * 1024,
+        'busy_timeout_ms': 15000,
+        'pool': 'queue',
+        'pool_size': 5,
+    },
+    # Single worker / scripts: one shared connection, no pool overhead
+    'single': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size_kib': 64 * 1024,
+        'busy_timeout_ms': 15000,
+        'pool': 'static',
+    },
+    # Previous behaviour: rollback journal, SQLite defaults
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+        'cache_size_kib': 2000,
+        'busy_timeout_ms': 5000,
+        'pool': 'queue',
+        'pool_size': 5,
+    },
+}
 
 class DatabaseManager:
-    def __init__(self, bucket_name='flight-database', db_filename='flight_inspection.db'):
+    def __init__(self, bucket_name='flight-database', db_filename='flight_inspection.db', storage_backend=None, engine_profile=None, replicate=True):
         self.bucket_name = bucket_name
         self.db_filename = db_filename
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.engine_profile = engine_profile or os.getenv('DB_ENGINE_PROFILE', 'wal')
+        if self.engine_profile not in ENGINE_PROFILES:
+            raise ValueError(f"Unknown engine profile '{self.engine_profile}'. Choose from {list(ENGINE_PROFILES)}")
         self.local_db_path = os.path.join(tempfile.gettempdir(), self.db_filename)
+        # replicate=False: work on the local file only and leave uploads to the process that owns replication
+        self.storage_backend = None
+        self.sync = None
+        if replicate:
+            self.storage_backend = storage_backend or self.default_storage_backend(bucket_name)
+            self.sync = DatabaseSyncEngine(
+                self.storage_backend,
+                self.db_filename,
+                self.local_db_path,
+                debounce_seconds=float(os.getenv('DB_UPLOAD_DEBOUNCE_SECONDS', '5'))
+            )
         self.engine = None
         self.SessionLocal = None
+        self.checkpoint_registered = False
+
+    @staticmethod
+    def default_storage_backend(bucket_name):
+        # DB_STORAGE_DIR swaps GCS for a local directory (offline runs and testing)
+        storage_dir = os.getenv('DB_STORAGE_DIR')
+        if storage_dir:
+            return LocalStorageBackend(storage_dir)
+        return GCSStorageBackend(bucket_name)
 
     def initialize_db(self):
-        try:
-            self.download_db()
-        except exceptions.NotFound:
-            print(f"Database file not found in Cloud Storage. Creating a new one.")
-            self.create_new_db()
-        
-        self.engine = create_engine(f'sqlite:///{self.local_db_path}', echo=False)
+        # Gunicorn workers start together: the first restores or creates the file, the others
+        # attach to it, since replacing it under their open WAL connections would corrupt their view
+        with self.sync.file_lock() if self.sync is not None else nullcontext():
+            if self.sync is not None and os.path.exists(self.local_db_path):
+                self.sync.attach()
+            else:
+                try:
+                    self.download_db()
+                except exceptions.NotFound:
+                    print(f"Database file not found in Cloud Storage. Creating a new one.")
+                    self.create_new_db()
+
+            self.connect()
+            run_migrations(self.engine)
+        if not self.checkpoint_registered:
+            atexit.register(self.checkpoint)
+            self.checkpoint_registered = True
+
+    def connect(self):
+        """Builds the engine and session factory for the local file using the configured engine profile."""
+        self.engine = self.create_engine(self.local_db_path, ENGINE_PROFILES[self.engine_profile])
         self.SessionLocal = scoped_session(sessionmaker(
             autocommit=False, 
             autoflush=False, 
@@ -32,34 +104,61 @@ class DatabaseManager:
             expire_on_commit=False
         ))
 
+    @staticmethod
+    def create_engine(db_path, profile):
+        pool_options = {'poolclass': StaticPool} if profile['pool'] == 'static' else {
+            'poolclass': QueuePool,
+            'pool_size': profile['pool_size'],
+            'max_overflow': profile['pool_size'],
+        }
+        engine = create_engine(
+            f'sqlite:///{db_path}',
+            echo=False,
+            connect_args={'timeout': profile['busy_timeout_ms'] / 1000, 'check_same_thread': False},
+            **pool_options
+        )
+
+        @event.listens_for(engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={profile['synchronous']}")
+            cursor.execute(f"PRAGMA mmap_size={profile['mmap_size']}")
+            cursor.execute(f"PRAGMA cache_size=-{profile['cache_size_kib']}")
+            cursor.execute(f"PRAGMA busy_timeout={profile['busy_timeout_ms']}")
+            cursor.close()
+
+        return engine
+
     def download_db(self):
-        print(f"Downloading database '{self.db_filename}' from bucket '{self.bucket_name}' to local path '{self.local_db_path}'")
-        blob = self.bucket.blob(self.db_filename)
-        try:
-            blob.download_to_filename(self.local_db_path)
-            print("Database downloaded successfully")
-        except exceptions.NotFound:
-            print(f"Database '{self.db_filename}' not found in bucket '{self.bucket_name}'")
-        blob.download_to_filename(self.local_db_path)
+        if self.sync is None:
+            if not os.path.exists(self.local_db_path):
+                raise exceptions.NotFound(f"No local database at {self.local_db_path}")
+            return
+        self.sync.pull()
 
     def upload_db(self):
-        print(f"Uploading database '{self.db_filename}' from local path '{self.local_db_path}' to bucket '{self.bucket_name}'")
-        blob = self.bucket.blob(self.db_filename)
+        self.checkpoint()
+
+    def checkpoint(self):
+        """Uploads pending changes now instead of waiting for the debounce window."""
+        if self.sync is None:
+            return False
         try:
-            blob.upload_from_filename(self.local_db_path)
-            print("Database uploaded successfully")
+            return self.sync.checkpoint()
         except Exception as e:
             print(f"Error uploading database: {e}")
-        blob.upload_from_filename(self.local_db_path)
+            return False
 
     def create_new_db(self):
         print("Creating new database...")
         engine = create_engine(f'sqlite:///{self.local_db_path}', echo=False)
         print("Created engine")
         Base.metadata.create_all(engine)
+        stamp(engine)
+        engine.dispose()
         print("New database created with all tables.")
         self.upload_db()
-        print("Uploaded database successfully")
 
     @contextmanager
     def get_db(self):
@@ -75,11 +174,13 @@ class DatabaseManager:
             raise
         finally:
             session.close()
-            self.upload_db()
+            if self.sync is not None and self.sync.has_changes():
+                self.sync.mark_dirty()
 
     def create_tables(self):
         if not self.engine:
             self.initialize_db()
         Base.metadata.create_all(bind=self.engine)
+        run_migrations(self.engine)
         print("Database tables created or updated successfully.")
-        self.upload_db()
\ No newline at end of file
+        self.upload_db()
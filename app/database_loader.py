@@ -1,8 +1,13 @@
 from .flight_models import Inspection, SiteInspection, Flight, Photo, AuditEntry
 from .scope_checker import ScopeChecker 
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
 
+# Stay under SQLite's host-parameter limit (999 on older builds) in IN queries
+SQLITE_MAX_VARIABLES = 900
+
 class DatabaseLoader:
     def __init__(self, db: Session):
         self.db = db
@@ -80,15 +85,47 @@ class DatabaseLoader:
                 if any(value is not None for key, value in metadata.items() if key != 'Unique Identifier'):
                     unique_metadata[unique_identifier] = metadata
 
-        for metadata in unique_metadata.values():
-            # Check if the photo already exists in the database
-            existing_photo = self.db.query(Photo).filter_by(unique_identifier=metadata['Unique Identifier']).first()
-            if existing_photo:
-                # Update the existing photo metadata if necessary
-                pass
-            else:
-                # Add new photo metadata
-                self.add_new_photo(metadata)
+        existing_identifiers = self.get_existing_identifiers(list(unique_metadata))
+        new_rows = [self.photo_row(metadata) for unique_identifier, metadata in unique_metadata.items() if unique_identifier not in existing_identifiers]
+
+        inserted = 0
+        if new_rows:
+            # One executemany in one transaction; a row another worker inserted meanwhile is skipped, not an error
+            statement = sqlite_insert(Photo.__table__).on_conflict_do_nothing(index_elements=['unique_identifier'])
+            result = self.db.execute(statement, new_rows)
+            self.db.commit()
+            inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(new_rows)
+
+        skipped = len(unique_metadata) - inserted
+        print(f"Loaded photo metadata: {inserted} inserted, {skipped} skipped")
+        return {'inserted': inserted, 'skipped': skipped}
+
+    def get_existing_identifiers(self, unique_identifiers):
+        existing_identifiers = set()
+        for start in range(0, len(unique_identifiers), SQLITE_MAX_VARIABLES):
+            chunk = unique_identifiers[start:start + SQLITE_MAX_VARIABLES]
+            existing_identifiers.update(self.db.execute(select(Photo.unique_identifier).where(Photo.unique_identifier.in_(chunk))).scalars())
+        return existing_identifiers
+
+    @staticmethod
+    def photo_row(metadata):
+        return {
+            'flight_id': None,
+            'filename': metadata['File Name'],
+            'create_date': metadata['Create Date'],
+            'gps_latitude': metadata.get('GPS Latitude'),
+            'gps_longitude': metadata.get('GPS Longitude'),
+            'gimbal_pitch_degree': metadata.get('Gimbal Pitch Degree'),
+            'flight_yaw_degree': metadata.get('Flight Yaw Degree'),
+            'flight_x_speed': metadata.get('Flight X Speed'),
+            'flight_y_speed': metadata.get('Flight Y Speed'),
+            'relative_altitude': metadata.get('Relative Altitude'),
+            'image_width': metadata.get('Image Width'),
+            'image_length': metadata.get('Image Length'),
+            'digital_zoom_ratio': metadata.get('Digital Zoom Ratio'),
+            'unique_identifier': metadata['Unique Identifier'],
+            'file_path': metadata.get('File Path')
+        }
 
     def add_new_photo(self, metadata):
         # Check if the photo already exists
@@ -156,7 +193,12 @@ class DatabaseLoader:
             list: A list of Photo objects found in the database, or an empty list if none are found.
         """
         
-        return self.db.query(Photo).filter(Photo.unique_identifier.in_(unique_identifiers)).all()
+        unique_identifiers = list(unique_identifiers)
+        photos = []
+        for start in range(0, len(unique_identifiers), SQLITE_MAX_VARIABLES):
+            chunk = unique_identifiers[start:start + SQLITE_MAX_VARIABLES]
+            photos.extend(self.db.query(Photo).filter(Photo.unique_identifier.in_(chunk)).all())
+        return photos
     
     
 ## write main implementation for query metadata
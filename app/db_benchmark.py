@@ -0,0 +1,97 @@
+"""Concurrency benchmark: parallel /process calls from several worker processes against one SQLite file.
+
+Each worker process plays a gunicorn worker with its own engine over the shared database, so
+the numbers show how much readers and writers block each other under each engine profile.
+
+    python -m app.db_benchmark payload.json --requests 16 --workers 4 --profiles wal legacy
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask
+from .database import DatabaseManager, ENGINE_PROFILES
+from .db_sync import LocalStorageBackend
+from .routes import setup_routes
+from .job_queue import JobQueue, JobStore, JOB_DONE, JOB_FAILED
+from .process_pipeline import InspectionPipeline
+
+_client = None
+_payload = None
+
+
+def create_manager(profile, storage_dir, db_path):
+    manager = DatabaseManager(db_filename=os.path.basename(db_path), storage_backend=LocalStorageBackend(storage_dir), engine_profile=profile)
+    manager.local_db_path = db_path
+    manager.sync.local_path = db_path
+    return manager
+
+
+def init_worker(profile, storage_dir, db_path, payload_path):
+    global _client, _payload
+    manager = create_manager(profile, storage_dir, db_path)
+    manager.connect()
+    flask_app = Flask(__name__)
+    # One job at a time per worker process, like a synchronous gunicorn worker
+    job_store = JobStore(os.path.join(os.path.dirname(db_path), f'jobs_{os.getpid()}.db'))
+    setup_routes(flask_app, manager, JobQueue(job_store, partial(InspectionPipeline.run, manager), max_workers=1))
+    _client = flask_app.test_client()
+    with open(payload_path) as f:
+        _payload = json.load(f)
+
+
+def post_process(request_number):
+    start_time = time.perf_counter()
+    response = _client.post('/process', json=_payload)
+    if response.status_code != 202:
+        return time.perf_counter() - start_time, response.status_code
+    # /process only queues the run; time it through to the finished job
+    status_url = response.get_json()['status_url']
+    while True:
+        job = _client.get(status_url).get_json()
+        if job['status'] in (JOB_DONE, JOB_FAILED):
+            return time.perf_counter() - start_time, 200 if job['status'] == JOB_DONE else 500
+        time.sleep(0.05)
+
+
+def run_benchmark(payload_path, profile, requests, workers):
+    with tempfile.TemporaryDirectory() as work_dir:
+        storage_dir = os.path.join(work_dir, 'storage')
+        db_path = os.path.join(work_dir, f'benchmark_{profile}.db')
+        create_manager(profile, storage_dir, db_path).initialize_db()
+
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(profile, storage_dir, db_path, payload_path)) as executor:
+            results = list(executor.map(post_process, range(requests)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, status in results if status != 200)
+    return {
+        'profile': profile,
+        'requests': requests,
+        'workers': workers,
+        'seconds': elapsed,
+        'requests_per_second': requests / elapsed if elapsed > 0 else 0.0,
+        'p50_seconds': statistics.median(latencies),
+        'p95_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'failures': failures
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run parallel /process calls against one database per engine profile")
+    parser.add_argument('payload', help="JSON metadata list to POST to /process")
+    parser.add_argument('--requests', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--profiles', nargs='+', default=list(ENGINE_PROFILES), choices=list(ENGINE_PROFILES))
+    args = parser.parse_args()
+
+    results = [run_benchmark(args.payload, profile, args.requests, args.workers) for profile in args.profiles]
+    for result in results:
+        print(f"{result['profile']:>8}: {result['requests_per_second']:.2f} req/s, p50 {result['p50_seconds']:.2f}s, "
+              f"p95 {result['p95_seconds']:.2f}s, {result['failures']} failed ({result['requests']} requests, {result['workers']} workers)")
@@ -0,0 +1,453 @@
+import os
+import json
+import hashlib
+import sqlite3
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from google.api_core import exceptions
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process lock, so run a single worker process there
+    fcntl = None
+
+
+class SyncConflictError(Exception):
+    """The remote copy was changed by another writer; the local state was saved as a conflict copy instead."""
+
+
+class GCSStorageBackend:
+    def __init__(self, bucket_name: str):
+        from google.cloud import storage
+        self.bucket_name = bucket_name
+        self.storage_client = storage.Client()
+        self.bucket = self.storage_client.bucket(bucket_name)
+
+    def read(self, name: str) -> Tuple[bytes, int]:
+        """Returns (data, generation). Raises exceptions.NotFound."""
+        blob = self.bucket.blob(name)
+        data = blob.download_as_bytes()
+        return data, blob.generation
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        """Writes only if the remote generation still matches (0 = must not exist). Raises exceptions.PreconditionFailed."""
+        blob = self.bucket.blob(name)
+        blob.upload_from_string(data, if_generation_match=if_generation_match)
+        return blob.generation
+
+    def list(self, prefix: str) -> Dict[str, float]:
+        """Returns {name: last update as a Unix timestamp} for objects under prefix."""
+        return {blob.name: blob.updated.timestamp() for blob in self.storage_client.list_blobs(self.bucket_name, prefix=prefix)}
+
+    def delete(self, name: str) -> None:
+        try:
+            self.bucket.blob(name).delete()
+        except exceptions.NotFound:
+            pass
+
+
+class LocalStorageBackend:
+    """Filesystem stand-in for GCS with the same generation-precondition semantics."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, *name.split('/'))
+
+    def _generation(self, name: str) -> int:
+        try:
+            with open(f"{self._path(name)}.generation") as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+
+    def read(self, name: str) -> Tuple[bytes, int]:
+        with self.lock:
+            try:
+                with open(self._path(name), 'rb') as f:
+                    return f.read(), self._generation(name)
+            except FileNotFoundError:
+                raise exceptions.NotFound(f"{name} not found in {self.directory}")
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        with self.lock:
+            path = self._path(name)
+            current_generation = self._generation(name)
+            if if_generation_match is not None and current_generation != if_generation_match:
+                raise exceptions.PreconditionFailed(f"{name} is at generation {current_generation}, expected {if_generation_match}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.upload", 'wb') as f:
+                f.write(data)
+            os.replace(f"{path}.upload", path)
+            with open(f"{path}.generation", 'w') as f:
+                f.write(str(current_generation + 1))
+            return current_generation + 1
+
+    def list(self, prefix: str) -> Dict[str, float]:
+        objects = {}
+        for root, _, names in os.walk(self.directory):
+            for file_name in names:
+                if file_name.endswith(('.generation', '.upload')):
+                    continue
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                if name.startswith(prefix):
+                    try:
+                        objects[name] = os.stat(path).st_mtime
+                    except FileNotFoundError:
+                        pass
+        return objects
+
+    def delete(self, name: str) -> None:
+        with self.lock:
+            for path in (self._path(name), f"{self._path(name)}.generation"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class DatabaseSyncEngine:
+    """Keeps the local SQLite file and its object-storage copy in step without re-shipping it on every session.
+
+    The remote copy is a manifest listing content-addressed chunks of the database file. A checkpoint
+    uploads only the chunks whose hash is not already stored, so upload size follows the pages that
+    changed rather than the size of the database. Restore reuses any matching chunks of a local copy
+    and downloads the rest. A database stored as a single object by older versions is read as the base
+    snapshot and converted on the next checkpoint.
+
+    Sessions call mark_dirty(); the upload then happens once, in the background, after debounce_seconds
+    of quiet, or immediately at checkpoint(). The manifest is written with a generation precondition,
+    so a copy written by another instance is never silently overwritten.
+
+    When that precondition fails, the local snapshot is kept remotely as a conflict copy under
+    {name}.conflicts/ and SyncConflictError is raised. Every later checkpoint retries, saves newer
+    changes the same way and raises again until resolve_conflict() picks a side, so no write is
+    dropped without an error being reported.
+
+    Worker processes sharing one local file coordinate through a lock file and a sync-state file
+    next to it: only the first restores the database, and each upload starts from the generation
+    the last one, by any worker, left behind.
+
+    Chunks no longer referenced by the manifest or one of the newest conflict copies are deleted
+    after a successful checkpoint, at most once per GC_INTERVAL_SECONDS, so storage tracks the live
+    database rather than its whole history.
+    """
+
+    CHUNK_BYTES = 256 * 1024
+    TRANSFER_WORKERS = 8
+    # Chunk garbage collection: how often it runs, how old an unreferenced chunk must be before it
+    # is deleted (covers other writers mid-upload and readers mid-restore), and conflict copies kept
+    GC_INTERVAL_SECONDS = 3600
+    GC_GRACE_SECONDS = 3600
+    MAX_CONFLICT_COPIES = 5
+
+    def __init__(self, backend, object_name: str, local_path: str, debounce_seconds: float = 5.0, chunk_bytes: int = CHUNK_BYTES):
+        self.backend = backend
+        self.object_name = object_name
+        self.manifest_name = f"{object_name}.manifest.json"
+        self.chunk_prefix = f"{object_name}.chunks/"
+        self.conflict_prefix = f"{object_name}.conflicts/"
+        self.local_path = local_path
+        self.debounce_seconds = debounce_seconds
+        self.chunk_bytes = chunk_bytes
+        self.generation = 0
+        self.remote_chunks = set()
+        self.synced_signature = None
+        self.conflict = False
+        self.conflict_signature = None
+        self.last_upload_bytes = 0
+        self.last_gc = 0.0
+        self.timer = None
+        self.lock = threading.RLock()
+        self.lock_file = None
+        self.lock_depth = 0
+
+    @contextmanager
+    def file_lock(self):
+        """Serializes restore and upload with the other worker processes using the same local file. Re-entrant."""
+        with self.lock:
+            if self.lock_depth == 0 and fcntl is not None:
+                self.lock_file = open(f"{self.local_path}.lock", 'a')
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0 and self.lock_file is not None:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+                    self.lock_file.close()
+                    self.lock_file = None
+
+    @staticmethod
+    def signature_from_json(value):
+        if value is None:
+            return None
+        size, mtime_ns, wal_signature = value
+        return size, mtime_ns, tuple(wal_signature) if wal_signature is not None else None
+
+    def load_state(self) -> bool:
+        """Loads the sync state the last restore or upload in any worker left behind. Returns False if there is none."""
+        try:
+            with open(f"{self.local_path}.sync.json") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        self.generation = state['generation']
+        self.remote_chunks = set(state['remote_chunks'])
+        self.synced_signature = self.signature_from_json(state['synced_signature'])
+        self.conflict = state['conflict']
+        self.conflict_signature = self.signature_from_json(state['conflict_signature'])
+        return True
+
+    def save_state(self) -> None:
+        state = {
+            'generation': self.generation,
+            'remote_chunks': sorted(self.remote_chunks),
+            'synced_signature': self.synced_signature,
+            'conflict': self.conflict,
+            'conflict_signature': self.conflict_signature
+        }
+        with open(f"{self.local_path}.sync.json.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{self.local_path}.sync.json.tmp", f"{self.local_path}.sync.json")
+
+    def attach(self) -> None:
+        """Uses a local database another worker already restored or created, without touching the file."""
+        with self.file_lock():
+            if not self.load_state():
+                # Generation 0 makes the first upload fail its precondition (and keep a conflict copy)
+                # if the remote copy exists, rather than overwrite it with a file of unknown origin
+                print(f"No sync state for local database '{self.local_path}'; its first upload will be checked against the remote copy")
+
+    def file_signature(self):
+        try:
+            stat_result = os.stat(self.local_path)
+        except FileNotFoundError:
+            return None
+        # In WAL mode commits land in the -wal file and reach the main file only at a WAL checkpoint
+        try:
+            wal_stat = os.stat(f"{self.local_path}-wal")
+            wal_signature = (wal_stat.st_size, wal_stat.st_mtime_ns)
+        except FileNotFoundError:
+            wal_signature = None
+        return stat_result.st_size, stat_result.st_mtime_ns, wal_signature
+
+    def discard_wal(self) -> None:
+        # A leftover WAL would be replayed on top of the restored file
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.remove(f"{self.local_path}{suffix}")
+            except FileNotFoundError:
+                pass
+
+    def has_changes(self) -> bool:
+        return self.file_signature() != self.synced_signature
+
+    def map_transfers(self, func, *iterables) -> list:
+        try:
+            with ThreadPoolExecutor(max_workers=self.TRANSFER_WORKERS) as executor:
+                return list(executor.map(func, *iterables))
+        except RuntimeError:
+            # No new threads during interpreter shutdown (the atexit checkpoint), so transfer one at a time
+            return list(map(func, *iterables))
+
+    @staticmethod
+    def chunk_hash(chunk: bytes) -> str:
+        return hashlib.blake2b(chunk, digest_size=20).hexdigest()
+
+    def read_chunks(self, path: str) -> List[Tuple[str, bytes]]:
+        chunks = []
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_bytes)
+                if not chunk:
+                    break
+                chunks.append((self.chunk_hash(chunk), chunk))
+        return chunks
+
+    def pull(self) -> None:
+        """Restores the local database from the remote manifest, replacing the file. Raises exceptions.NotFound if there is none yet.
+
+        Only call this while no connection has the local file open.
+        """
+        with self.file_lock():
+            print(f"Downloading database '{self.object_name}' to local path '{self.local_path}'")
+            try:
+                manifest_data, generation = self.backend.read(self.manifest_name)
+            except exceptions.NotFound:
+                data, _ = self.backend.read(self.object_name)
+                self.discard_wal()
+                with open(self.local_path, 'wb') as f:
+                    f.write(data)
+                self.generation = 0
+                self.remote_chunks = set()
+                print(f"Downloaded single-object database ({len(data)} bytes); it will be chunked on the next upload")
+            else:
+                manifest = json.loads(manifest_data)
+                downloaded = self.restore(manifest)
+                self.generation = generation
+                self.remote_chunks = set(manifest['chunks'])
+                print(f"Database restored (generation {self.generation}, downloaded {downloaded} of {manifest['size']} bytes)")
+            self.synced_signature = self.file_signature()
+            self.conflict = False
+            self.conflict_signature = None
+            self.save_state()
+
+    def restore(self, manifest: Dict) -> int:
+        # Chunks the local copy already has are not downloaded again
+        local_chunks = {}
+        if os.path.exists(self.local_path) and manifest['chunk_bytes'] == self.chunk_bytes:
+            local_chunks = dict(self.read_chunks(self.local_path))
+
+        missing = [chunk_id for chunk_id in set(manifest['chunks']) if chunk_id not in local_chunks]
+        downloads = self.map_transfers(lambda chunk_id: self.backend.read(self.chunk_prefix + chunk_id), missing)
+        for chunk_id, (chunk, _) in zip(missing, downloads):
+            local_chunks[chunk_id] = chunk
+
+        temp_path = f"{self.local_path}.restore"
+        with open(temp_path, 'wb') as f:
+            for chunk_id in manifest['chunks']:
+                f.write(local_chunks[chunk_id])
+        self.discard_wal()
+        os.replace(temp_path, self.local_path)
+        return sum(len(local_chunks[chunk_id]) for chunk_id in missing)
+
+    def mark_dirty(self) -> None:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce_seconds, self._background_upload)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _background_upload(self) -> None:
+        try:
+            self.checkpoint()
+        except Exception as e:
+            print(f"Error uploading database: {e}")
+
+    def upload_chunk(self, chunk_id: str, chunk: bytes) -> None:
+        try:
+            self.backend.write(self.chunk_prefix + chunk_id, chunk, if_generation_match=0)
+        except exceptions.PreconditionFailed:
+            pass  # Content-addressed, so an existing chunk already holds these bytes
+
+    def checkpoint(self) -> bool:
+        """Uploads changed chunks now if the file changed since the last sync. Returns True if an upload happened."""
+        with self.file_lock():
+            # Another worker may have uploaded since this one last did
+            self.load_state()
+            try:
+                return self.upload_changes()
+            finally:
+                self.save_state()
+
+    def upload_changes(self) -> bool:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            signature = self.file_signature()
+            if signature is None or signature == self.synced_signature:
+                return False
+            if self.conflict and signature == self.conflict_signature:
+                raise SyncConflictError(f"'{self.object_name}' has unreplicated changes: the remote copy was changed by another writer")
+
+            # Chunk a consistent snapshot taken with the SQLite backup API, never a file mid-write
+            snapshot_fd, snapshot_path = tempfile.mkstemp(suffix='.db')
+            os.close(snapshot_fd)
+            try:
+                source = sqlite3.connect(self.local_path)
+                target = sqlite3.connect(snapshot_path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                    source.close()
+                chunks = self.read_chunks(snapshot_path)
+            finally:
+                os.remove(snapshot_path)
+
+            new_chunks = {chunk_id: chunk for chunk_id, chunk in chunks if chunk_id not in self.remote_chunks}
+            self.map_transfers(self.upload_chunk, list(new_chunks.keys()), list(new_chunks.values()))
+
+            manifest = {
+                'chunk_bytes': self.chunk_bytes,
+                'size': sum(len(chunk) for _, chunk in chunks),
+                'chunks': [chunk_id for chunk_id, _ in chunks]
+            }
+            print(f"Uploading database '{self.object_name}' (generation {self.generation}, {len(new_chunks)} of {len(chunks)} chunks changed)")
+            try:
+                self.generation = self.backend.write(self.manifest_name, json.dumps(manifest).encode(), if_generation_match=self.generation)
+            except exceptions.PreconditionFailed:
+                # Keep these changes reachable remotely; the chunks they need were uploaded above
+                conflict_name = f"{self.conflict_prefix}{time.time_ns()}-{self.generation}.manifest.json"
+                self.backend.write(conflict_name, json.dumps(manifest).encode())
+                self.conflict = True
+                self.conflict_signature = signature
+                self.remote_chunks |= set(new_chunks)
+                print(f"ERROR: remote copy of '{self.object_name}' was changed by another writer; local changes saved as '{conflict_name}'")
+                raise SyncConflictError(f"'{self.object_name}' conflicts with the remote copy; local changes saved as '{conflict_name}'")
+            self.conflict = False
+            self.conflict_signature = None
+            self.remote_chunks = set(manifest['chunks'])
+            self.synced_signature = signature
+            self.last_upload_bytes = sum(len(chunk) for chunk in new_chunks.values())
+            print(f"Database uploaded successfully (generation {self.generation}, {self.last_upload_bytes} bytes)")
+            if time.monotonic() - self.last_gc >= self.GC_INTERVAL_SECONDS:
+                try:
+                    self.collect_garbage(manifest)
+                except Exception as e:
+                    print(f"Error collecting unused database chunks: {e}")
+            return True
+
+    def collect_garbage(self, manifest: Dict) -> int:
+        """Deletes chunks that neither the current manifest nor a kept conflict copy references. Returns the count."""
+        with self.lock:
+            self.last_gc = time.monotonic()
+            live_chunks = set(manifest['chunks'])
+
+            conflict_names = sorted(name for name in self.backend.list(self.conflict_prefix) if name.endswith('.manifest.json'))
+            stale_conflicts = conflict_names[:-self.MAX_CONFLICT_COPIES]
+            for conflict_name in conflict_names[len(stale_conflicts):]:
+                live_chunks.update(json.loads(self.backend.read(conflict_name)[0])['chunks'])
+            for conflict_name in stale_conflicts:
+                self.backend.delete(conflict_name)
+
+            cutoff = time.time() - self.GC_GRACE_SECONDS
+            unused = [name for name, updated in self.backend.list(self.chunk_prefix).items()
+                      if name[len(self.chunk_prefix):] not in live_chunks and updated < cutoff]
+            self.map_transfers(self.backend.delete, unused)
+            self.remote_chunks.difference_update(name[len(self.chunk_prefix):] for name in unused)
+            if unused or stale_conflicts:
+                print(f"Deleted {len(unused)} unused chunks and {len(stale_conflicts)} old conflict copies of '{self.object_name}'")
+            return len(unused)
+
+    def resolve_conflict(self, keep_local: bool) -> None:
+        """Ends a conflict. keep_local=True uploads the local file over the remote copy; False discards local
+        changes and restores the remote copy, so only do that with no connections open on the file."""
+        with self.file_lock():
+            if not keep_local:
+                self.pull()
+                return
+            # Saved before the upload, since checkpoint() starts from the shared sync state
+            self.load_state()
+            _, self.generation = self.backend.read(self.manifest_name)
+            self.conflict = False
+            self.conflict_signature = None
+            self.synced_signature = None
+            self.save_state()
+            self.checkpoint()
+
+    def close(self) -> None:
+        self.checkpoint()
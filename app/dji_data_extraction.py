@@ -9,18 +9,68 @@ from multiprocessing import Pool, Value
 import pandas as pd
 from geopy.distance import geodesic
 import math
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator, Iterable, Sequence
+import numpy as np
 import logging
+import time
+import heapq
+import queue
+import itertools
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from .exiftool_pool import ExifToolPool, normalize_path
+from .dji_exif_reader import DJIMetadataReader, NATIVE_REQUIRED_KEYS
+from .ingest_manifest import IngestManifest, manifest_path_for
+from .photo_scanner import PhotoScanner
+from .metadata_store import PhotoMetadataStore
+from .site_index import SiteSpatialIndex, MATCH_RADIUS_FEET, SAME_POSITION_FEET, is_valid_coordinate, haversine_feet
 
 PHOTO_BASE_PATH = r'Shared\photos\cable anchor'
 
+exiftool_retry = retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(subprocess.CalledProcessError))
+
+
+def bounded_imap_unordered(pool, func, items: Iterable, max_in_flight: int) -> Iterator[Any]:
+    """Like Pool.imap_unordered, but never submits more than max_in_flight tasks ahead of the consumer.
+
+    pool only needs an apply_async(func, args, callback, error_callback) method, so this works for
+    multiprocessing.Pool and ExifToolPool alike. If the caller stops pulling, no new work is submitted.
+    """
+    results = queue.Queue()
+    items = iter(items)
+    in_flight = 0
+
+    def submit(item) -> None:
+        pool.apply_async(func, (item,), callback=results.put, error_callback=lambda e: results.put(_TaskError(e)))
+
+    for item in itertools.islice(items, max_in_flight):
+        submit(item)
+        in_flight += 1
+
+    while in_flight:
+        result = results.get()
+        in_flight -= 1
+        if isinstance(result, _TaskError):
+            raise result.exception
+        # Refill before handing the result over so the workers stay busy while the consumer works
+        for item in itertools.islice(items, 1):
+            submit(item)
+            in_flight += 1
+        yield result
+
+
+class _TaskError:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
 
 class DataImportAndPreprocessing:
     def __init__(self):
         pass
 
     def write_data_to_file(self, data: Any, filename: str) -> None:
+        if filename.endswith('.parquet'):
+            PhotoMetadataStore.write(data, filename)
+            return
         with open(filename, 'wb') as f:
             pickle.dump(data, f)
 
@@ -31,6 +81,8 @@ class DJIDroneDataImport(DataImportAndPreprocessing):
                                 'Exposure Compensation', 'Max Aperture Value', 'Light Source', 'Focal Length', 'Custom Rendered', 'Exposure Mode', 'White Balance', 'Digital Zoom Ratio', 'Focal Length In 35mm Format', 'Scene Capture Type',
                                 'Gain Control', 'Contrast', 'Saturation', 'Sharpness', 'GPS Version ID', 'Relative Altitude', 'Gimbal Pitch Degree', 'Gimbal Yaw Degree', 'Flight Yaw Degree', 'Flight X Speed', 'Flight Y Speed', 'GPS Latitude', 'GPS Longitude',
                                 'Preview Image', 'Circle Of Confusion', 'Field Of View', 'GPS Position', 'Hyperfocal Distance', 'Light Value', 'Image Width', 'Image Height']
+        self.native_reader = DJIMetadataReader()
+        self.scanner = PhotoScanner()
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         handler = logging.FileHandler('dji_data_extraction.log')
@@ -54,7 +106,7 @@ class DJIDroneDataImport(DataImportAndPreprocessing):
             self.logger.error(f"Input DMS: {dms}")
             return None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(subprocess.CalledProcessError))
+    @exiftool_retry
     def get_detailed_metadata(self, file_path: str, keys_to_extract: List[str]) -> Dict[str, str]:
         try:
             command = ['exiftool'] + [file_path]
@@ -76,85 +128,240 @@ class DJIDroneDataImport(DataImportAndPreprocessing):
             self.logger.error(f"Unexpected error processing {file_path}: {e}")
             raise
 
-    def process_file(self, file_path: str, keys_to_extract: List[str]) -> Dict[str, Any]:
+    @exiftool_retry
+    def get_batch_metadata(self, pool: ExifToolPool, file_paths: List[str], keys_to_extract: List[str]) -> Dict[str, Dict[str, str]]:
+        # exiftool -json reports tag names ('GPSLatitude'); keys_to_extract uses descriptions ('GPS Latitude')
+        tag_to_key = {key.replace(' ', ''): key for key in keys_to_extract}
         try:
-            metadata = self.get_detailed_metadata(file_path, keys_to_extract)
+            entries = pool.run_batch(file_paths)
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"Exiftool worker error for batch of {len(file_paths)} files: {e}")
+            raise
 
-            if keys_to_extract is None or all(key in metadata for key in keys_to_extract):
-                for key in ['Gimbal Pitch Degree', 'Relative Altitude', 'Flight Yaw Degree']:
-                    if key in metadata and isinstance(metadata[key], str):
-                        metadata[key] = re.sub(r'[^\d.-]', '', metadata[key])
+        batch_metadata = {}
+        for file_path in file_paths:
+            entry = entries.get(normalize_path(file_path), {})
+            batch_metadata[file_path] = {tag_to_key[tag]: str(value) for tag, value in entry.items() if tag in tag_to_key}
+        return batch_metadata
 
-                gps_latitude_dms = metadata.get('GPS Latitude', None)
-                gps_longitude_dms = metadata.get('GPS Longitude', None)
+    def process_batch(self, pool: ExifToolPool, file_paths: List[str], keys_to_extract: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        try:
+            batch_metadata = self.get_batch_metadata(pool, file_paths, keys_to_extract)
+        except Exception as e:
+            self.logger.error(f"Batch extraction failed, falling back to per-file exiftool: {e}")
+            return [(file_path, self.process_file(file_path, keys_to_extract)) for file_path in file_paths]
+
+        results = []
+        for file_path in file_paths:
+            try:
+                results.append((file_path, self.normalize_metadata(batch_metadata[file_path], file_path, keys_to_extract)))
+            except Exception as e:
+                self.logger.error(f"Failed to process {file_path}: {str(e)}")
+                results.append((file_path, None))
+        return results
 
-                if gps_latitude_dms and gps_longitude_dms:
-                    gps_latitude_dd = self.dms_to_dd(gps_latitude_dms)
-                    gps_longitude_dd = self.dms_to_dd(gps_longitude_dms)
-                    metadata['GPS Latitude'] = gps_latitude_dd
-                    metadata['GPS Longitude'] = gps_longitude_dd
+    def process_file(self, file_path: str, keys_to_extract: List[str]) -> Dict[str, Any]:
+        try:
+            metadata = self.get_detailed_metadata(file_path, keys_to_extract)
+            return self.normalize_metadata(metadata, file_path, keys_to_extract)
+        except Exception as e:
+            self.logger.error(f"Failed to process {file_path}: {str(e)}")
+            return None
 
-                file_modification_date_time_str = metadata.get('Create Date', None)
-                if file_modification_date_time_str:
+    def process_file_native(self, file_path: str) -> Tuple[str, Dict[str, Any]]:
+        try:
+            metadata = self.native_reader.read(file_path)
+        except Exception as e:
+            self.logger.debug(f"Native reader failed for {file_path}: {e}")
+            return file_path, None
+
+        if not all(key in metadata for key in NATIVE_REQUIRED_KEYS):
+            self.logger.debug(f"Native reader missing keys for {file_path}: {[key for key in NATIVE_REQUIRED_KEYS if key not in metadata]}")
+            return file_path, None
+        return file_path, self.normalize_metadata(metadata, file_path, NATIVE_REQUIRED_KEYS)
+
+    def process_batch_native(self, file_paths: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        return [self.process_file_native(file_path) for file_path in file_paths]
+
+    def normalize_metadata(self, metadata: Dict[str, Any], file_path: str, keys_to_extract: List[str]) -> Dict[str, Any]:
+        if keys_to_extract is None or all(key in metadata for key in keys_to_extract):
+            for key in ['Gimbal Pitch Degree', 'Relative Altitude', 'Flight Yaw Degree']:
+                if key in metadata and isinstance(metadata[key], str):
+                    metadata[key] = re.sub(r'[^\d.-]', '', metadata[key])
+
+            gps_latitude_dms = metadata.get('GPS Latitude', None)
+            gps_longitude_dms = metadata.get('GPS Longitude', None)
+
+            if gps_latitude_dms and gps_longitude_dms:
+                gps_latitude_dd = self.dms_to_dd(gps_latitude_dms)
+                gps_longitude_dd = self.dms_to_dd(gps_longitude_dms)
+                metadata['GPS Latitude'] = gps_latitude_dd
+                metadata['GPS Longitude'] = gps_longitude_dd
+
+            file_modification_date_time_str = metadata.get('Create Date', None)
+            if file_modification_date_time_str:
+                try:
+                    file_modification_date_time_dt = datetime.strptime(file_modification_date_time_str, '%Y:%m:%d %H:%M:%S%z')
+                    file_modification_date_time_dt = file_modification_date_time_dt.replace(tzinfo=None)
+                    metadata['Create Date'] = file_modification_date_time_dt
+                except ValueError:
                     try:
-                        file_modification_date_time_dt = datetime.strptime(file_modification_date_time_str, '%Y:%m:%d %H:%M:%S%z')
-                        file_modification_date_time_dt = file_modification_date_time_dt.replace(tzinfo=None)
+                        file_modification_date_time_dt = datetime.strptime(file_modification_date_time_str, '%Y:%m:%d %H:%M:%S')
                         metadata['Create Date'] = file_modification_date_time_dt
                     except ValueError:
-                        try:
-                            file_modification_date_time_dt = datetime.strptime(file_modification_date_time_str, '%Y:%m:%d %H:%M:%S')
-                            metadata['Create Date'] = file_modification_date_time_dt
-                        except ValueError:
-                            self.logger.error(f"Failed to parse 'Create Date' for {metadata.get('File Name', 'unknown file')}: {file_modification_date_time_str}")
-                            metadata['Create Date'] = None
-
-                return metadata
-            else:
-                missing_keys = [key for key in keys_to_extract if key not in metadata]
-                self.logger.error(f"Missing keys in metadata for {file_path}: {missing_keys}")
-                return None
-        except Exception as e:
-            self.logger.error(f"Failed to process {file_path}: {str(e)}")
+                        self.logger.error(f"Failed to parse 'Create Date' for {metadata.get('File Name', 'unknown file')}: {file_modification_date_time_str}")
+                        metadata['Create Date'] = None
+
+            return metadata
+        else:
+            missing_keys = [key for key in keys_to_extract if key not in metadata]
+            self.logger.error(f"Missing keys in metadata for {file_path}: {missing_keys}")
             return None
 
-    def process_file_with_progress(self, args: Tuple[str, List[str]]) -> Dict[str, Any]:
+    def process_file_with_progress(self, args: Tuple[str, List[str]]) -> Tuple[str, Dict[str, Any]]:
         file_path, keys_to_extract = args
-        return self.process_file(file_path, keys_to_extract)
-
-    def extract_data(self, folder_path: str) -> List[Dict[str, Any]]:
-        files = []
-        for root, _, filenames in os.walk(folder_path):
-            for filename in filenames:
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')):
-                    files.append(os.path.join(root, filename))
-
-        # Sort files by creation time
-        files.sort(key=lambda x: os.path.getctime(x))
-
-        progress_counter = multiprocessing.Value('i', 0)
-
-        with multiprocessing.Pool() as pool:
-            flight_metadata_list = []
-            total_files = len(files)
-            with tqdm(total=total_files, desc="Processing files", ncols=100) as progress_bar:
-                for metadata in pool.imap_unordered(self.process_file_with_progress, [(file_path, self.keys_to_extract) for file_path in files]):
+        return file_path, self.process_file(file_path, keys_to_extract)
+
+    def iter_extracted_metadata(self, files: List[str], mode: str = 'native', max_in_flight: int = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields (file_path, metadata) as files finish; metadata is None for files that could not be parsed."""
+        max_in_flight = max_in_flight or 2 * multiprocessing.cpu_count()
+        if mode == 'native':
+            # In-process EXIF/XMP parsing first; only files it cannot handle go to exiftool
+            failed_files = []
+            with multiprocessing.Pool() as pool:
+                for results in bounded_imap_unordered(pool, self.process_batch_native, self.batches(files, 16), max_in_flight):
+                    for file_path, metadata in results:
+                        if metadata is None:
+                            failed_files.append(file_path)
+                        else:
+                            yield file_path, metadata
+            if failed_files:
+                self.logger.info(f"Native reader could not handle {len(failed_files)} files, falling back to exiftool")
+                yield from self.iter_extracted_metadata(failed_files, 'stay_open', max_in_flight)
+        elif mode == 'per_file':
+            with multiprocessing.Pool() as pool:
+                yield from bounded_imap_unordered(pool, self.process_file_with_progress, ((file_path, self.keys_to_extract) for file_path in files), max_in_flight)
+        elif mode == 'stay_open':
+            exiftool_pool = ExifToolPool()
+            try:
+                exiftool_pool.start()
+            except (OSError, subprocess.SubprocessError) as e:
+                # e.g. exiftool not installed: these files fail, the rest of the run carries on
+                exiftool_pool.close()
+                self.logger.error(f"Could not start exiftool, {len(files)} files left unparsed: {e}")
+                for file_path in files:
+                    yield file_path, None
+                return
+            try:
+                process_batch = lambda batch: self.process_batch(exiftool_pool, batch, self.keys_to_extract)
+                for results in bounded_imap_unordered(exiftool_pool, process_batch, self.batches(files, exiftool_pool.batch_size), max_in_flight):
+                    yield from results
+            finally:
+                exiftool_pool.close()
+        else:
+            raise ValueError(f"Unknown extraction mode: {mode}")
+
+    @staticmethod
+    def batches(files: List[str], batch_size: int) -> Iterator[List[str]]:
+        for i in range(0, len(files), batch_size):
+            yield files[i:i + batch_size]
+
+    def add_unique_identifier(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        # Create a unique identifier using timestamp and original filename
+        create_date = metadata.get('Create Date')
+        if create_date:
+            timestamp = create_date.strftime('%Y%m%d%H%M%S')
+            original_filename = metadata['File Name']
+            unique_identifier = f"{timestamp}_{original_filename}"
+            metadata['Unique Identifier'] = unique_identifier
+        return metadata
+
+    def iter_metadata(self, folder_path: str, mode: str = 'native', ordered: bool = False, use_manifest: bool = True, manifest_path: str = None,
+                      max_in_flight: int = None, reorder_window: int = 256, show_progress: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yields photo metadata as extraction finishes instead of waiting for the whole folder.
+
+        At most max_in_flight tasks are queued ahead of the consumer, so a slow consumer throttles the
+        workers. With ordered=True records come out in Create Date order: extracted records pass through
+        a min-heap of reorder_window entries and are merged with the (already sorted) manifest hits.
+        """
+        scanned_files = self.scanner.scan(folder_path)
+        # Roughly capture order from the stat already cached by scandir; this only keeps the
+        # ordered mode's reorder buffer small, the final order comes from Create Date
+        scanned_files.sort(key=lambda item: (item[1].st_mtime_ns, item[0]))
+        files = [file_path for file_path, _ in scanned_files]
+        file_stats = dict(scanned_files)
+
+        cached_metadata_list = []
+        pending_files = files
+        manifest = None
+        if use_manifest:
+            manifest = IngestManifest(manifest_path or manifest_path_for(folder_path), self.keys_to_extract).load()
+            pending_files = []
+            for file_path in files:
+                cached_metadata = manifest.lookup(file_path, file_stats[file_path])
+                if cached_metadata is None:
+                    pending_files.append(file_path)
+                else:
+                    cached_metadata_list.append(cached_metadata)
+            print(f"Manifest: reusing {manifest.hits} photos, extracting {len(pending_files)}")
+
+        def extracted_records() -> Iterator[Dict[str, Any]]:
+            with tqdm(total=len(pending_files), desc="Processing files", ncols=100, disable=not show_progress) as progress_bar:
+                for file_path, metadata in self.iter_extracted_metadata(pending_files, mode, max_in_flight):
+                    progress_bar.update(1)
                     if metadata is not None:
-                        # Create a unique identifier using timestamp and original filename
-                        create_date = metadata.get('Create Date')
-                        if create_date:
-                            timestamp = create_date.strftime('%Y%m%d%H%M%S')
-                            original_filename = metadata['File Name']
-                            unique_identifier = f"{timestamp}_{original_filename}"
-                            metadata['Unique Identifier'] = unique_identifier
-                        flight_metadata_list.append(metadata)
-                    with progress_counter.get_lock():
-                        progress_counter.value += 1
-                        progress_bar.update(progress_counter.value - progress_bar.n)
-
-        flight_metadata_list = [metadata for metadata in flight_metadata_list if metadata is not None]
+                        self.add_unique_identifier(metadata)
+                        if manifest is not None:
+                            manifest.record(file_path, file_stats[file_path], metadata)
+                        yield metadata
+
+        try:
+            if ordered:
+                cached_metadata_list.sort(key=self.create_date_key)
+                yield from heapq.merge(cached_metadata_list, self.reorder(extracted_records(), reorder_window), key=self.create_date_key)
+            else:
+                yield from cached_metadata_list
+                yield from extracted_records()
+        finally:
+            if manifest is not None:
+                manifest.prune(files)
+                manifest.save()
+
+    @staticmethod
+    def create_date_key(metadata: Dict[str, Any]) -> datetime:
+        return metadata.get('Create Date') or datetime.min
+
+    def reorder(self, records: Iterator[Dict[str, Any]], window: int) -> Iterator[Dict[str, Any]]:
+        """Restores Create Date order for records that arrive at most `window` positions out of place."""
+        heap = []
+        last_emitted = datetime.min
+        for sequence, metadata in enumerate(records):
+            heapq.heappush(heap, (self.create_date_key(metadata), sequence, metadata))
+            if len(heap) > window:
+                create_date, _, earliest = heapq.heappop(heap)
+                if create_date < last_emitted:
+                    self.logger.warning(f"Reorder window of {window} exceeded at {earliest.get('File Name')}")
+                last_emitted = max(last_emitted, create_date)
+                yield earliest
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def extract_data(self, folder_path: str, mode: str = 'native', use_manifest: bool = True, manifest_path: str = None) -> List[Dict[str, Any]]:
+        flight_metadata_list = list(self.iter_metadata(folder_path, mode=mode, use_manifest=use_manifest, manifest_path=manifest_path, show_progress=True))
         flight_metadata_list.sort(key=lambda x: x['Create Date'])
         return flight_metadata_list
 
+    def benchmark_extraction(self, folder_path: str, modes: Tuple[str, ...] = ('per_file', 'stay_open', 'native')) -> Dict[str, float]:
+        """Runs extract_data once per mode and returns photos/sec for each."""
+        results = {}
+        for mode in modes:
+            start_time = time.perf_counter()
+            flight_metadata_list = self.extract_data(folder_path, mode=mode, use_manifest=False)
+            elapsed = time.perf_counter() - start_time
+            results[mode] = len(flight_metadata_list) / elapsed if elapsed > 0 else 0.0
+            print(f"{mode}: {len(flight_metadata_list)} photos in {elapsed:.2f}s ({results[mode]:.1f} photos/sec)")
+        return results
+
 
 class SalesforceDataImport(DataImportAndPreprocessing):
     def __init__(self):
@@ -193,14 +400,26 @@ class SiteLocation(DataImportAndPreprocessing):
         super().__init__()
         self.metadata: List[Dict[str, Any]] = []
         self.inspection_data: List[Dict[str, Any]] = []
+        self.inspection_data_version = None
+
+    @property
+    def inspection_data(self) -> List[Dict[str, Any]]:
+        return self._inspection_data
 
+    @inspection_data.setter
+    def inspection_data(self, inspection_data: List[Dict[str, Any]]) -> None:
+        self._inspection_data = inspection_data
+        self._site_index = None
 
+    @property
+    def site_index(self) -> SiteSpatialIndex:
+        # Shared across requests through SiteSpatialIndex's cache, so it is built once per inspection-data version
+        if self._site_index is None:
+            self._site_index = SiteSpatialIndex.for_sites(self.inspection_data, self.inspection_data_version)
+        return self._site_index
 
     def is_valid_coordinate(self, lat: float, lon: float) -> bool:
-        return (lat is not None and lon is not None and 
-                isinstance(lat, (int, float)) and isinstance(lon, (int, float)) and
-                not math.isnan(lat) and not math.isnan(lon) and
-                -90 <= lat <= 90 and -180 <= lon <= 180)
+        return is_valid_coordinate(lat, lon)
 
     def find_matching_site(self, photo_data: Dict[str, Any]) -> Dict[str, Any]:
         #print('photo data:', photo_data)
@@ -218,27 +437,11 @@ class SiteLocation(DataImportAndPreprocessing):
                     'Pilot Name': 'Unknown Pilot', # Return 'Unknown Pilot' directly
                     'Matched Index': -1}
 
-        nearest_site = None  # Initialize nearest_site here
-        nearest_distance = float('inf')
-        nearest_index = -1
-
-        for site_index, site in enumerate(self.inspection_data):
-            site_lat = site.get('Latitude')
-            site_lon = site.get('Longitude')
-            if self.is_valid_coordinate(site_lat, site_lon):
-                try:
-                    distance = geodesic((photo_lat, photo_lon), (site_lat, site_lon)).feet
-                    
-                    if distance < nearest_distance:
-                        nearest_distance = distance
-                        nearest_site = site
-                        nearest_index = site_index
-                        #print(f"Found nearest site: {nearest_site.get('Site ID', 'Unknown Site')} at distance {nearest_distance} feet")
-                except ValueError:
-                    print(f"Error calculating distance for site {site.get('Site ID', 'Unknown')}")
-                    continue
+        # Only sites in nearby grid cells get an exact geodesic distance
+        nearest_index, nearest_distance = self.site_index.nearest(photo_lat, photo_lon)
+        nearest_site = self.inspection_data[nearest_index] if nearest_index >= 0 else None
 
-        if nearest_site and nearest_distance <= 500:
+        if nearest_site and nearest_distance <= MATCH_RADIUS_FEET:
             #print(f"Matched to site: {nearest_site.get('Site ID', 'Unknown Site')} at distance {nearest_distance} feet")
             return {'File Name': photo_data.get('File Name', 'Unknown File'),
                     'Site ID': nearest_site.get('Site ID', 'Unknown Site'),
@@ -256,6 +459,47 @@ class SiteLocation(DataImportAndPreprocessing):
                     'Matched Index': -1}
             
             
+    def match_sites(self, lat_array: Sequence[Any], lon_array: Sequence[Any]) -> List[Dict[str, Any]]:
+        """Batch form of find_matching_site for a sequence of photo coordinates in capture order.
+
+        Returns one dict per photo with Site ID, Latitude, Longitude, Pilot Name and Matched Index.
+        A photo within SAME_POSITION_FEET of the last position that was actually matched reuses that
+        match; the remaining positions are matched together with one vectorized distance pass.
+        """
+        results: List[Dict[str, Any]] = [None] * len(lat_array)
+        anchor_points = []
+        anchor_of_photo = {}
+        anchor_lat = anchor_lon = None
+
+        for photo_index, (photo_lat, photo_lon) in enumerate(zip(lat_array, lon_array)):
+            if not self.is_valid_coordinate(photo_lat, photo_lon):
+                print(f"Invalid coordinates: {photo_lat}, {photo_lon}")
+                results[photo_index] = {'Site ID': 'Invalid Coordinates',
+                                        'Latitude': photo_lat,
+                                        'Longitude': photo_lon,
+                                        'Pilot Name': 'Unknown Pilot',
+                                        'Matched Index': -1}
+                continue
+
+            if anchor_lat is None or haversine_feet(photo_lat, photo_lon, anchor_lat, anchor_lon) > SAME_POSITION_FEET:
+                anchor_points.append((photo_lat, photo_lon))
+                anchor_lat, anchor_lon = photo_lat, photo_lon
+            anchor_of_photo[photo_index] = len(anchor_points) - 1
+
+        anchor_lats = np.array([lat for lat, _ in anchor_points], dtype=np.float64)
+        anchor_lons = np.array([lon for _, lon in anchor_points], dtype=np.float64)
+        nearest_indices, _ = self.site_index.nearest_many(anchor_lats, anchor_lons)
+
+        for photo_index, anchor in anchor_of_photo.items():
+            nearest_index = int(nearest_indices[anchor])
+            nearest_site = self.inspection_data[nearest_index] if nearest_index >= 0 else None
+            results[photo_index] = {'Site ID': nearest_site.get('Site ID', 'Unknown Site') if nearest_site else 'Unknown Site',
+                                    'Latitude': lat_array[photo_index],
+                                    'Longitude': lon_array[photo_index],
+                                    'Pilot Name': nearest_site.get('Pilot Name', 'Unknown Pilot') if nearest_site else 'Unknown Pilot',
+                                    'Matched Index': nearest_index}
+        return results
+
     def process_locations(self) -> None:
         print("Starting process_locations...")
         for photo in tqdm(self.metadata, desc="Processing locations"):
@@ -277,8 +521,5 @@ class SiteLocation(DataImportAndPreprocessing):
         
 
 
-
-
-
-
-
+if __name__ == '__main__':
+    DJIDroneDataImport().benchmark_extraction(PHOTO_BASE_PATH)
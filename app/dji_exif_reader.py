@@ -0,0 +1,203 @@
+import os
+import re
+import struct
+from typing import Dict, Any, Optional, Tuple
+
+# Tags the native reader produces, named the way exiftool describes them
+NATIVE_KEYS = ['File Name', 'Create Date', 'Exposure Time', 'F Number', 'ISO', 'Focal Length', 'Digital Zoom Ratio', 'Focal Length In 35mm Format',
+               'GPS Version ID', 'Relative Altitude', 'Gimbal Pitch Degree', 'Gimbal Yaw Degree', 'Flight Yaw Degree', 'Flight X Speed', 'Flight Y Speed',
+               'GPS Latitude', 'GPS Longitude', 'GPS Position', 'Image Width', 'Image Height']
+
+# Tags a photo must have for the native result to be used instead of exiftool
+NATIVE_REQUIRED_KEYS = ['File Name', 'Create Date', 'GPS Latitude', 'GPS Longitude', 'Relative Altitude', 'Gimbal Pitch Degree',
+                        'Flight Yaw Degree', 'Flight X Speed', 'Flight Y Speed', 'Image Width', 'Image Height']
+
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+EXIF_HEADER = b'Exif\x00\x00'
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+DJI_XMP_KEYS = {
+    'RelativeAltitude': 'Relative Altitude',
+    'GimbalPitchDegree': 'Gimbal Pitch Degree',
+    'GimbalYawDegree': 'Gimbal Yaw Degree',
+    'FlightYawDegree': 'Flight Yaw Degree',
+    'FlightXSpeed': 'Flight X Speed',
+    'FlightYSpeed': 'Flight Y Speed',
+}
+DJI_XMP_PATTERN = re.compile(rb'drone-dji:(\w+)(?:="([^"]*)"|>([^<]*)<)')
+
+# TIFF field type -> (struct format, size in bytes)
+TIFF_TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8), 7: ('B', 1), 9: ('l', 4), 10: ('ll', 8)}
+
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+
+class DJIMetadataReader:
+    """Reads the EXIF block and DJI XMP packet from the head of a JPEG without running exiftool.
+
+    Only the marker segments before the image data are touched: APP1 and SOF segments are read,
+    everything else (including the multi-segment DJI preview) is skipped with a seek.
+    """
+
+    def __init__(self, max_scan_bytes: int = 512 * 1024):
+        self.max_scan_bytes = max_scan_bytes
+
+    def read(self, file_path: str) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {'File Name': os.path.basename(file_path)}
+        seen_exif = seen_xmp = seen_sof = False
+
+        with open(file_path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                raise ValueError(f"Not a JPEG file: {file_path}")
+
+            while f.tell() < self.max_scan_bytes and not (seen_exif and seen_xmp and seen_sof):
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                code = marker[1]
+                if code == 0xFF:
+                    # Fill byte, the real marker code follows
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                if code in (0xD9, 0xDA):
+                    # EOI or start of scan: no more metadata segments
+                    break
+                if 0xD0 <= code <= 0xD7 or code == 0x01:
+                    continue
+
+                length_bytes = f.read(2)
+                if len(length_bytes) < 2:
+                    break
+                length = struct.unpack('>H', length_bytes)[0] - 2
+
+                if code == 0xE1:
+                    segment = f.read(length)
+                    if segment.startswith(EXIF_HEADER):
+                        self.parse_exif(segment[len(EXIF_HEADER):], metadata)
+                        seen_exif = True
+                    elif segment.startswith(XMP_HEADER):
+                        self.parse_xmp(segment[len(XMP_HEADER):], metadata)
+                        seen_xmp = True
+                elif code in SOF_MARKERS:
+                    segment = f.read(length)
+                    height, width = struct.unpack('>HH', segment[1:5])
+                    metadata['Image Width'] = str(width)
+                    metadata['Image Height'] = str(height)
+                    seen_sof = True
+                else:
+                    f.seek(length, os.SEEK_CUR)
+
+        return metadata
+
+    def parse_xmp(self, packet: bytes, metadata: Dict[str, Any]) -> None:
+        for name, attribute_value, element_value in DJI_XMP_PATTERN.findall(packet):
+            key = DJI_XMP_KEYS.get(name.decode('ascii'))
+            if key:
+                value = attribute_value or element_value
+                metadata[key] = value.decode('utf-8', errors='replace').strip()
+
+    def parse_exif(self, tiff: bytes, metadata: Dict[str, Any]) -> None:
+        if tiff[:2] == b'II':
+            endian = '<'
+        elif tiff[:2] == b'MM':
+            endian = '>'
+        else:
+            raise ValueError("Invalid TIFF header in EXIF block")
+
+        ifd0_offset = struct.unpack(endian + 'L', tiff[4:8])[0]
+        ifd0 = self.read_ifd(tiff, ifd0_offset, endian)
+        exif_ifd = self.read_ifd(tiff, ifd0[EXIF_IFD_POINTER], endian) if EXIF_IFD_POINTER in ifd0 else {}
+        gps_ifd = self.read_ifd(tiff, ifd0[GPS_IFD_POINTER], endian) if GPS_IFD_POINTER in ifd0 else {}
+
+        if 0x9004 in exif_ifd:
+            metadata['Create Date'] = exif_ifd[0x9004]
+        if 0x829A in exif_ifd:
+            metadata['Exposure Time'] = self.format_exposure_time(exif_ifd[0x829A])
+        if 0x829D in exif_ifd:
+            metadata['F Number'] = f"{exif_ifd[0x829D]:.1f}"
+        if 0x8827 in exif_ifd:
+            metadata['ISO'] = str(exif_ifd[0x8827])
+        if 0x920A in exif_ifd:
+            metadata['Focal Length'] = f"{exif_ifd[0x920A]:.1f} mm"
+        if 0xA404 in exif_ifd:
+            metadata['Digital Zoom Ratio'] = self.format_number(exif_ifd[0xA404])
+        if 0xA405 in exif_ifd:
+            metadata['Focal Length In 35mm Format'] = f"{exif_ifd[0xA405]} mm"
+        # The SOF segment is authoritative, these only cover files where it is past the scan limit
+        if 0xA002 in exif_ifd:
+            metadata.setdefault('Image Width', str(exif_ifd[0xA002]))
+        if 0xA003 in exif_ifd:
+            metadata.setdefault('Image Height', str(exif_ifd[0xA003]))
+
+        if 0x0000 in gps_ifd:
+            metadata['GPS Version ID'] = '.'.join(str(part) for part in gps_ifd[0x0000])
+        latitude = self.format_coordinate(gps_ifd.get(0x0002), gps_ifd.get(0x0001))
+        longitude = self.format_coordinate(gps_ifd.get(0x0004), gps_ifd.get(0x0003))
+        if latitude and longitude:
+            metadata['GPS Latitude'] = latitude
+            metadata['GPS Longitude'] = longitude
+            metadata['GPS Position'] = f"{latitude}, {longitude}"
+
+    def read_ifd(self, tiff: bytes, offset: int, endian: str) -> Dict[int, Any]:
+        entries = {}
+        if offset + 2 > len(tiff):
+            return entries
+        count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+        for index in range(count):
+            entry_offset = offset + 2 + index * 12
+            if entry_offset + 12 > len(tiff):
+                break
+            tag, field_type, value_count = struct.unpack(endian + 'HHL', tiff[entry_offset:entry_offset + 8])
+            if field_type not in TIFF_TYPES:
+                continue
+            value = self.read_value(tiff, entry_offset + 8, field_type, value_count, endian)
+            if value is not None:
+                entries[tag] = value
+        return entries
+
+    def read_value(self, tiff: bytes, value_field_offset: int, field_type: int, value_count: int, endian: str) -> Optional[Any]:
+        type_format, type_size = TIFF_TYPES[field_type]
+        total_size = type_size * value_count
+        if total_size <= 4:
+            data_offset = value_field_offset
+        else:
+            data_offset = struct.unpack(endian + 'L', tiff[value_field_offset:value_field_offset + 4])[0]
+        data = tiff[data_offset:data_offset + total_size]
+        if len(data) < total_size:
+            return None
+
+        if field_type == 2:
+            return data.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+        if field_type in (5, 10):
+            values = struct.unpack(endian + type_format * value_count, data)
+            values = [numerator / denominator if denominator else 0.0 for numerator, denominator in zip(values[0::2], values[1::2])]
+        else:
+            values = list(struct.unpack(endian + type_format[0] * value_count, data))
+        if field_type == 1 or field_type == 7 or value_count > 1:
+            return values
+        return values[0]
+
+    @staticmethod
+    def format_exposure_time(seconds: float) -> str:
+        # Matches exiftool's PrintExposureTime
+        if 0 < seconds < 0.25001:
+            return f"1/{int(0.5 + 1 / seconds)}"
+        formatted = f"{seconds:.1f}"
+        return formatted[:-2] if formatted.endswith('.0') else formatted
+
+    @staticmethod
+    def format_number(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+    @staticmethod
+    def format_coordinate(dms: Optional[list], ref: Optional[str]) -> Optional[str]:
+        # Same layout exiftool prints, so DJIDroneDataImport.dms_to_dd handles both sources
+        if not dms or len(dms) != 3 or not ref:
+            return None
+        degrees, minutes, seconds = dms
+        decimal = degrees + minutes / 60 + seconds / 3600
+        degrees = int(decimal)
+        minutes = int((decimal - degrees) * 60)
+        seconds = ((decimal - degrees) * 60 - minutes) * 60
+        return f"{degrees} deg {minutes}' {seconds:.2f}\" {ref.strip()[:1]}"
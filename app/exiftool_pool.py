@@ -0,0 +1,151 @@
+import os
+import json
+import queue
+import subprocess
+import multiprocessing
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Callable, Optional
+
+
+def normalize_path(file_path: str) -> str:
+    # exiftool reports SourceFile with forward slashes on Windows, so compare normalized paths
+    return os.path.normcase(os.path.normpath(file_path))
+
+
+class ExifToolProcess:
+    """A single long-lived `exiftool -stay_open` process fed through stdin."""
+
+    def __init__(self, executable: str = 'exiftool'):
+        self.executable = executable
+        self.process: Optional[subprocess.Popen] = None
+        self.execute_count = 0
+        self.logger = logging.getLogger(__name__)
+        self.start()
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [self.executable, '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self.execute_count = 0
+
+    def restart(self) -> None:
+        self.logger.warning(f"Restarting exiftool worker (pid {self.process.pid if self.process else 'n/a'})")
+        self.terminate()
+        self.start()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, args: List[str]) -> str:
+        if not self.is_alive():
+            self.start()
+
+        self.execute_count += 1
+        marker = f"{{ready{self.execute_count}}}".encode()
+        payload = '\n'.join(args) + f"\n-execute{self.execute_count}\n"
+
+        try:
+            self.process.stdin.write(payload.encode('utf-8'))
+            self.process.stdin.flush()
+
+            output = bytearray()
+            fd = self.process.stdout.fileno()
+            while marker not in output[-(len(marker) + 8):]:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise BrokenPipeError("exiftool closed its output stream")
+                output += chunk
+        except (BrokenPipeError, OSError) as e:
+            # Restart so the next attempt (tenacity retry) gets a healthy worker
+            returncode = self.process.poll()
+            self.restart()
+            raise subprocess.CalledProcessError(returncode if returncode is not None else -1, [self.executable, '-stay_open'] + args, str(e))
+
+        return output[:output.rindex(marker)].decode('utf-8', errors='replace')
+
+    def get_metadata_batch(self, file_paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        stdout = self.execute(['-json', '-charset', 'filename=utf8'] + list(file_paths)).strip()
+        if not stdout:
+            return {}
+        try:
+            entries = json.loads(stdout)
+        except json.JSONDecodeError as e:
+            self.restart()
+            raise subprocess.CalledProcessError(-1, [self.executable, '-json'], f"Invalid JSON from exiftool: {e}")
+        return {normalize_path(entry.get('SourceFile', '')): entry for entry in entries}
+
+    def terminate(self) -> None:
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write(b'-stay_open\nFalse\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        finally:
+            self.process = None
+
+
+class ExifToolPool:
+    """One stay_open exiftool worker per core, fed batches of file paths."""
+
+    def __init__(self, processes: Optional[int] = None, batch_size: int = 32, executable: str = 'exiftool'):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.executable = executable
+        self.workers: List[ExifToolProcess] = []
+        self.idle_workers: queue.Queue = queue.Queue()
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> 'ExifToolPool':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def start(self) -> None:
+        for _ in range(self.processes):
+            worker = ExifToolProcess(self.executable)
+            self.workers.append(worker)
+            self.idle_workers.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=self.processes)
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        for worker in self.workers:
+            worker.terminate()
+        self.workers = []
+        self.idle_workers = queue.Queue()
+
+    def run_batch(self, file_paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        worker = self.idle_workers.get()
+        try:
+            return worker.get_metadata_batch(file_paths)
+        finally:
+            self.idle_workers.put(worker)
+
+    def apply_async(self, func: Callable, args: tuple = (), callback: Callable = None, error_callback: Callable = None) -> Future:
+        """Same calling convention as multiprocessing.Pool.apply_async, run on the pool's threads."""
+        def on_done(future: Future) -> None:
+            if future.cancelled():
+                return
+            exception = future.exception()
+            if exception is not None:
+                if error_callback:
+                    error_callback(exception)
+            elif callback:
+                callback(future.result())
+
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(on_done)
+        return future
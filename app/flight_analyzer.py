@@ -5,7 +5,6 @@ from .tower_flight_type_1_analyzer import TowerFlightType1Analyzer
 from .tower_flight_type_2_analyzer import TowerFlightType2Analyzer
 from .compound_flight_analyzer import CompoundCheckAnalyzer
 from .top_down_analyzer import TopDownAnalyzer
-from .database import DatabaseManager
 from .dji_data_extraction import SiteLocation
 import pandas as pd
 from .flight_models import *
@@ -23,10 +22,17 @@ load_dotenv()
 DATABASE_URL=os.getenv('DATABASE_PATH')
 
 class FlightAnalyzer:
-    def __init__(self, db, flight_data_df, passfail_list):
+    def __init__(self, db, flight_data_df, passfail_list, report=None):
         self.db = db
         self.flight_data_df = flight_data_df
         self.passfail_list = passfail_list
+        self.report = report or (lambda stage, **details: None)
+        self.gemini_calls = 0
+
+    def analyzer_done(self, name, analyzer):
+        gemini_calls = getattr(getattr(analyzer, 'image_analyzer', None), 'calls_issued', 0)
+        self.gemini_calls += gemini_calls
+        self.report('analyzer_done', analyzer=name, gemini_calls=gemini_calls)
 
     def run_analysis(self):
         print("Starting run_analysis method")
@@ -44,6 +50,8 @@ class FlightAnalyzer:
             print(f"Adding audit entry for orbit analysis: inspection_id={self.inspection_id}, site_id={self.site_id}")
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Orbit Analysis", orbit_result, datetime.now(pytz.timezone('US/Central')))
 
+        self.analyzer_done('Orbit', orbit_analyzer)
+
         # Add similar print statements for other analyzers
 
         print("Completed run_analysis method")
@@ -53,6 +61,7 @@ class FlightAnalyzer:
         ascent_descent_result = ascent_descent_analyzer.analyze(self.passfail_list)
         if ascent_descent_result:
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Ascent/Descent Analysis", ascent_descent_result, datetime.now(pytz.timezone('US/Central')))
+        self.analyzer_done('Ascent/Descent', ascent_descent_analyzer)
 
         compound_analyzer = CompoundCheckAnalyzer()
         compound_analyzer.passfail_data = self.passfail_list
@@ -60,6 +69,7 @@ class FlightAnalyzer:
         compound_result = compound_analyzer.analyze_compound_check()
         if compound_result:
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Compound Check Analysis", compound_result, datetime.now(pytz.timezone('US/Central')))
+        self.analyzer_done('Compound Check', compound_analyzer)
 
         top_down_analyzer = TopDownAnalyzer()
         top_down_analyzer.passfail_data = self.passfail_list
@@ -67,74 +77,74 @@ class FlightAnalyzer:
         top_down_result = top_down_analyzer.analyze_top_down()
         if top_down_result:
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Top Down Analysis", top_down_result, datetime.now(pytz.timezone('US/Central')))
+        self.analyzer_done('Top Down', top_down_analyzer)
 
         tf1_analyzer = TowerFlightType1Analyzer(self.passfail_list, self.flight_data_df)
         tf1_result = tf1_analyzer.analyze()
         if tf1_result:
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Tower Flight Type 1 Analysis", tf1_result, datetime.now(pytz.timezone('US/Central')))
+        self.analyzer_done('Tower Flight Type 1', tf1_analyzer)
 
         tf2_analyzer = TowerFlightType2Analyzer(self.passfail_list, self.flight_data_df)
         tf2_result = tf2_analyzer.analyze()
         if tf2_result:
             AuditManager.add_audit_entry(self.db, self.inspection_id, self.site_id, "System", "Tower Flight Type 2 Analysis", tf2_result, datetime.now(pytz.timezone('US/Central')))
+        self.analyzer_done('Tower Flight Type 2', tf2_analyzer)
+        self.report('gemini_calls_issued', calls=self.gemini_calls)
 
 
     def populate_flight_analysis_result(self, processed_metadata, passfail_list, flight_requirements):
-        with DatabaseManager().get_db() as db:
+        # Same session as the rest of the analysis, so no extra engine or database download per request
+        db = self.db
 
-            site_location = SiteLocation()
-            try:
-                site_location.inspection_data = InspectionDataReader.read_inspection_data()
-            except Exception as e:
-                print(f"Error reading inspection data: {str(e)}")
-                site_location.inspection_data = []
+        inspection_data = InspectionDataReader.try_read_inspection_snapshot()
 
 
-            site_id = next((item.get('Site ID', 'Unknown') for item in processed_metadata), 'Unknown')
-            scope_requirement = next((item.get('Scope Package', 'Unknown') for item in site_location.inspection_data if item.get('Site ID') == site_id), 'Unknown')
-            inspection_id = str(next((item.get('Inspection', 'Unknown') for item in site_location.inspection_data if item.get('Site ID') == site_id), 'Unknown'))
+        site_id = next((item.get('Site ID', 'Unknown') for item in processed_metadata), 'Unknown')
+        scope_requirement = inspection_data.lookup(site_id, 'Scope Package')
+        inspection_id = str(inspection_data.lookup(site_id, 'Inspection'))
 
-            existing_inspection = db.query(Inspection).filter_by(inspection_id=inspection_id).first()
-            if existing_inspection:
-                inspection = existing_inspection
-                inspection.status = "Updated"
-            else:
-                inspection = Inspection(inspection_id=inspection_id, status="New")
+        existing_inspection = db.query(Inspection).filter_by(inspection_id=inspection_id).first()
+        if existing_inspection:
+            inspection = existing_inspection
+            inspection.status = "Updated"
+        else:
+            inspection = Inspection(inspection_id=inspection_id, status="New")
+        
+        db.add(inspection)
+        db.flush()
+
+        site_inspection = db.query(SiteInspection).filter_by(site_id=site_id, inspection_id=inspection.inspection_id).first()
+        if site_inspection:
+            site_inspection.scope_requirement = scope_requirement
+            #required_flights, captured_flights = ScopeChecker.process_scope(db, site_inspection, flight_requirements)
             
-            db.add(inspection)
-            db.flush()
-
-            site_inspection = db.query(SiteInspection).filter_by(site_id=site_id, inspection_id=inspection.inspection_id).first()
-            if site_inspection:
-                site_inspection.scope_requirement = scope_requirement
-                #required_flights, captured_flights = ScopeChecker.process_scope(db, site_inspection, flight_requirements)
-                
-                if site_inspection.scope_status == InspectionStatus.SCOPE_PASSED:
-                    site_inspection.status = InspectionStatus.COMPLETED
-                    # Add audit entry for scope status change
-                    AuditManager.add_audit_entry(
-                        db,
-                        inspection.inspection_id,
-                        site_inspection.site_id,
-                        "System",
-                        "Scope Status Changed",
-                        {"new_status": "PASSED"},
-                        datetime.now(pytz.timezone('US/Central'))
-                    )
-                else:
-                    site_inspection.status = InspectionStatus.IN_PROGRESS
+            if site_inspection.scope_status == InspectionStatus.SCOPE_PASSED:
+                site_inspection.status = InspectionStatus.COMPLETED
+                # Add audit entry for scope status change
+                AuditManager.add_audit_entry(
+                    db,
+                    inspection.inspection_id,
+                    site_inspection.site_id,
+                    "System",
+                    "Scope Status Changed",
+                    {"new_status": "PASSED"},
+                    datetime.now(pytz.timezone('US/Central'))
+                )
             else:
-                site_inspection = SiteInspection(site_id=site_id, inspection_id=inspection.inspection_id, scope_requirement=scope_requirement, status=InspectionStatus.IN_PROGRESS)
-                db.add(site_inspection)
+                site_inspection.status = InspectionStatus.IN_PROGRESS
+        else:
+            site_inspection = SiteInspection(site_id=site_id, inspection_id=inspection.inspection_id, scope_requirement=scope_requirement, status=InspectionStatus.IN_PROGRESS)
+            db.add(site_inspection)
 
-            db.commit()
-            db.refresh(inspection)
+        db.commit()
+        db.refresh(inspection)
 
-            # Check inspection status using InspectionChecker
-            inspection_status = InspectionChecker.check_inspection_status(self.db, site_inspection)
-            print(f"Inspection Status: {inspection_status}")
+        # Check inspection status using InspectionChecker
+        inspection_status = InspectionChecker.check_inspection_status(self.db, site_inspection)
+        print(f"Inspection Status: {inspection_status}")
 
-            # Placeholder for pass request conditions
-            # TODO: Implement the conditions for pass request
+        # Placeholder for pass request conditions
+        # TODO: Implement the conditions for pass request
 
-            return inspection.inspection_id
+        return inspection.inspection_id
@@ -3,7 +3,7 @@ from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 from sqlalchemy import Enum as SQLAlchemyEnum
 from enum import Enum as PyEnum
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 import pytz
 
 
@@ -39,6 +39,7 @@ class OrbitType(PyEnum):
 
 class Photo(Base):
     __tablename__ = 'photos'
+    __table_args__ = (Index('ix_photos_flight_id_filename', 'flight_id', 'filename'),)
 
     photo_id = Column(Integer, primary_key=True, autoincrement=True)
     flight_id = Column(Integer, ForeignKey('flights.flight_id'))
@@ -56,6 +57,7 @@ class Photo(Base):
     image_length = Column(Integer)
     digital_zoom_ratio = Column(Float)
     unique_identifier = Column(String, unique=True)
+    file_path = Column(String)
 
     flight = relationship("Flight", back_populates="photos")
 
@@ -78,7 +80,8 @@ class Photo(Base):
             'image_width': self.image_width,
             'image_length': self.image_length,
             'digital_zoom_ratio': self.digital_zoom_ratio,
-            'unique_identifier': self.unique_identifier
+            'unique_identifier': self.unique_identifier,
+            'file_path': self.file_path
         }
         
     def __repr__(self):
@@ -87,6 +90,7 @@ class Photo(Base):
 
 class AuditEntry(Base):
     __tablename__ = 'audit_trail'
+    __table_args__ = (Index('ix_audit_trail_inspection_site_timestamp', 'inspection_id', 'site_id', 'timestamp'),)
 
     audit_id = Column(Integer, primary_key=True, autoincrement=True)
     inspection_id = Column(String, ForeignKey('inspections.inspection_id'))
@@ -125,6 +129,27 @@ class AuditEntry(Base):
             }
         )
 
+    @classmethod
+    def create_flight_status_entry(cls, inspection_id, site_id, flight_id, pilot_name, flight_name, previous_result, result, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.now(pytz.timezone('US/Central'))
+        return cls(
+            inspection_id=inspection_id,
+            site_id=site_id,
+            flight_id=flight_id,
+            user="System",
+            action=f"Flight {flight_name} Status Changed",
+            pilot_name=pilot_name,
+            flight_name=flight_name,
+            result=result,
+            timestamp=timestamp,
+            details={
+                "flight_name": flight_name,
+                "previous_result": previous_result,
+                "result": result
+            }
+        )
+
     @classmethod
     def create_scope_check_entry(cls, inspection_id, site_id, required_flights, captured_flights, result, timestamp=None):
         if timestamp is None:
@@ -250,6 +275,7 @@ class AuditEntry(Base):
 
 class FlightAnalysis(Base):
     __tablename__ = 'flight_analysis'
+    __table_args__ = (Index('ix_flight_analysis_site_id', 'site_id'),)
 
     flight_id = Column(Integer, ForeignKey('flights.flight_id'), primary_key=True)
     weakest_link_horizontal_overlap_status = Column(String, nullable=True)
@@ -305,6 +331,10 @@ class FlightAnalysis(Base):
 
 class Flight(Base):
     __tablename__ = 'flights'
+    __table_args__ = (
+        Index('ix_flights_site_id_inspection_id', 'site_id', 'inspection_id', 'flight_name'),
+        Index('ix_flights_inspection_id', 'inspection_id'),
+    )
 
     flight_id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(String, ForeignKey('sites.site_id'))
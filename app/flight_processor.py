@@ -1,17 +1,18 @@
 from .flight_models import *
 from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update, func
 from .scope_checker import ScopeChecker
+from .database_loader import SQLITE_MAX_VARIABLES
 
 # This module processes flight data for site inspections, ensuring that each site has a set of required flights.
 # The process involves the following steps:
 # 1. Retrieve the site inspection data from the database.
 # 2. Determine the required flights based on the site's scope requirement.
-# 3. Create empty Flight objects for each required flight with default values.
-# 4. Process the pass/fail list to create Flight objects with their associated FlightAnalysis.
-# 5. For each flight in the pass/fail list:
-#    - If the flight already exists and its list of photos is different from the incoming flight's list, update it.
-#    - If the flight does not exist, add it to the site inspection.
-# 6. Ensure that flights with matching photos are not unnecessarily replaced.
+# 3. Collect the incoming flights from the pass/fail list by flight name.
+# 4. Load the filenames already stored for the site's flights in one query.
+# 5. For each incoming flight that already exists, add only the photos it does not have yet.
+# 6. Create Flight objects (with FlightAnalysis and photos) only for flights the site does not have,
+#    plus empty pending Flight objects for required flights that were not captured.
 # 7. Add new flights to the site inspection and commit changes to the database.
 # 8. Handle special cases in data processing, such as converting 'N/A' to None and processing specific fields like 'total_rotation' and 'north_facing_check'.
 # 9. Add system flight audit entries for tracking changes and maintaining a history of flight data.
@@ -43,33 +44,56 @@ class FlightProcessor:
             required_flights = []  # or handle this case as appropriate for your application
         print(f"Required flights: {required_flights}")
 
-        # Step 3: Create empty Flight objects for each required flight with default values
-        all_flights = {flight_name: Flight(
-            site_id=site_inspection.site_id,
-            inspection_id=site_inspection.inspection_id,
-            flight_name=flight_name,
-            required=True,
-            status=FlightStatus.PENDING,
-            is_captured=False,
-            created_at=timestamp
-        ) for flight_name in required_flights}
-
-        # Step 4: Process the pass/fail list to create Flight objects with their associated FlightAnalysis
+        # Step 3: Collect the incoming flights by name (the last item for a name wins)
         for item in passfail_list:
             item['Site ID'] = site_inspection.site_id  
 
-        # Step 5: For each flight in the pass/fail list
+        incoming_items = {}
         for item in passfail_list:
-            # Step 5: For each flight in the pass/fail list
-            #print(f"Item: {item}")
             if 'Photos' not in item:
                 print(f"Photos key missing in item: {item}")
-            if item.get('Site ID') == site_inspection.site_id:
-                flight_name = item.get('Flight Category', 'Unknown').lower()
-                status = FlightProcessor.determine_flight_status(item)
-                print(f"FLIGHT {flight_name} status: {status}")
-                print(f"Processing flight: {flight_name}, status: {status}")
+            incoming_items[item.get('Flight Category', 'Unknown').lower()] = item
 
+        # Step 4: One query for the filenames already stored on each of the site's flights
+        existing_flights = {flight.flight_name: flight for flight in site_inspection.flights}
+        print(f"Existing flights: {list(existing_flights.keys())}")
+        existing_photos = FlightProcessor.get_existing_photo_names(db, [flight.flight_id for flight in existing_flights.values()])
+
+        # Step 5: Existing flights only get the photos they do not have yet
+        for flight_name, item in incoming_items.items():
+            if flight_name not in existing_flights:
+                continue
+            existing_flight = existing_flights[flight_name]
+            photos_to_add = [photo for photo in dict.fromkeys(item.get('Photos', [])) if photo not in existing_photos.get(existing_flight.flight_id, set())]
+
+            if photos_to_add:
+                print(f"Adding {len(photos_to_add)} new photos to flight: {flight_name}")
+                FlightProcessor.add_photos(db, existing_flight, photos_to_add)
+
+                # Update flight status based on all photos
+                existing_flight.status = FlightProcessor.determine_flight_status(item)
+                db.add(existing_flight)
+            else:
+                print(f"No new unique photos found for flight: {flight_name}")
+
+        # Step 6: Create ORM objects only for flights the site does not have yet
+        new_flight_names = [name for name in dict.fromkeys(required_flights + list(incoming_items)) if name not in existing_flights]
+        for flight_name in new_flight_names:
+            item = incoming_items.get(flight_name)
+            if item is None:
+                # Required flight that has not been captured yet
+                flight = Flight(
+                    site_id=site_inspection.site_id,
+                    inspection_id=site_inspection.inspection_id,
+                    flight_name=flight_name,
+                    required=True,
+                    status=FlightStatus.PENDING,
+                    is_captured=False,
+                    created_at=timestamp
+                )
+            else:
+                status = FlightProcessor.determine_flight_status(item)
+                print(f"Creating new flight: {flight_name}, status: {status}")
                 flight = Flight(
                     site_id=site_inspection.site_id,
                     inspection_id=site_inspection.inspection_id,
@@ -81,81 +105,14 @@ class FlightProcessor:
                     created_at=timestamp
                 )
                 flight.analysis = FlightProcessor.create_flight_analysis(flight, item)
-                print('adding photos')
-                FlightProcessor.add_photos(flight, item.get('Photos', []))
-
-                all_flights[flight_name] = flight
 
+            # Step 7: Add new flights to the site inspection
+            print(f"Adding flight: {flight}")
+            site_inspection.flights.append(flight)
+            db.add(flight)
+            if item is not None:
+                FlightProcessor.add_photos(db, flight, list(dict.fromkeys(item.get('Photos', []))))
 
-
-        # Step 6: Ensure that flights with matching photos are not unnecessarily replaced
-        existing_flights = {flight.flight_name: flight for flight in site_inspection.flights}
-        print(f"Existing flights: {list(existing_flights.keys())}")
-
-        for item in passfail_list:  # Iterate through all flights from passfail_list
-            flight_name = item.get('Flight Category', 'Unknown').lower()
-            print(f"Processing flight: {flight_name}") # Debug: Indicate which flight is being processed
-
-            if flight_name in existing_flights:
-                existing_flight = existing_flights[flight_name]
-                print(f"Found existing flight: {existing_flight}") # Debug: Confirm existing flight found
-                new_flight = all_flights.get(flight_name)
-                new_photos = {photo.filename for photo in new_flight.photos} if new_flight else set()
-                existing_photos = {photo.filename for photo in existing_flight.photos}
-
-                print(f"Existing photos for {flight_name}: {existing_photos}") # Debug: Show existing photos
-                print(f"New photos for {flight_name}: {new_photos}") # Debug: Show new photos
-                print(f"New photos == existing photos: {new_photos == existing_photos}") # Debug: Show comparison result
-
-                photos_to_add = new_photos - existing_photos  # Find photos that are new
-                print(f"Photos to add: {photos_to_add}") # Debug: Show photos to add
-
-                if photos_to_add:
-                    print(f"Adding {len(photos_to_add)} new photos to flight: {flight_name}")
-                    FlightProcessor.add_photos(existing_flight, photos_to_add)  # Add only the new photos
-
-                    # Update flight status based on all photos
-                    existing_flight.status = FlightProcessor.determine_flight_status(item)
-                    db.add(existing_flight)
-                    print(f"Updated flight with new photos: {existing_flight}")
-                else:
-                    print(f"No new unique photos found for flight: {flight_name}") # Debug: Indicate no new photos
-
-            else:
-                # Flight doesn't exist, create and add photos
-                if flight_name in all_flights:
-                    print(f"Flight '{flight_name}' already exists in all_flights. Skipping creation.")
-                else:
-                    # Flight doesn't exist, create and add photos
-                    print(f"Creating new flight: {flight_name}")
-                    flight = Flight(
-                        site_id=site_inspection.site_id,
-                        inspection_id=site_inspection.inspection_id,
-                        flight_name=flight_name,
-                        required=(flight_name in required_flights),
-                        status=FlightProcessor.determine_flight_status(item),
-                        is_captured=True,
-                        pilot_name="john doe",
-                        created_at=timestamp
-                    )
-                    flight.analysis = FlightProcessor.create_flight_analysis(flight, item)
-                    FlightProcessor.add_photos(flight, item.get('Photos', []))
-                    site_inspection.flights.append(flight)
-                    db.add(flight)
-
-        # Step 7: Add new flights to the site inspection and commit changes to the database
-        for flight in all_flights.values():
-            if flight.flight_name not in existing_flights:
-                print(f"Adding flight: {flight}")
-                site_inspection.flights.append(flight)
-                db.add(flight)
-                
-        captured_flights = set()
-        for flight in all_flights.values():
-            if flight.is_captured:
-                captured_flights.add(flight.flight_name)
-                
-                
         # print(f"Site Inspection ID: {site_inspection.site_id}")
         # print(f"Scope Requirement: {site_inspection.scope_requirement}")
         # print(f"Pass/Fail List: {passfail_list}")
@@ -327,12 +284,50 @@ class FlightProcessor:
 
 
     @staticmethod
-    def add_photos(flight, photos):
-        for photo in photos:
-            photo_entry = Photo(flight_id=flight.flight_id, filename=photo, photo_metadata={})
-            #print(f"Adding photo {photo} for flight {flight.flight_name}")
-            flight.photos.append(photo_entry)
-    #print(f"Added photos for flight {Flight.flight_name}: {[photo.filename for photo in Flight.photos]}")
+    def get_existing_photo_names(db, flight_ids):
+        """Returns {flight_id: set of photo unique identifiers} for the given flights, from one query on the photo index."""
+        existing_photos = {}
+        if not flight_ids:
+            return existing_photos
+        # Rows created by older versions carry the unique identifier in filename only
+        rows = db.query(Photo.flight_id, func.coalesce(Photo.unique_identifier, Photo.filename)).filter(Photo.flight_id.in_(flight_ids))
+        for flight_id, filename in rows:
+            existing_photos.setdefault(flight_id, set()).add(filename)
+        return existing_photos
+
+    @staticmethod
+    def add_photos(db, flight, unique_identifiers):
+        """Points the ingested photo rows at the flight. A row is created only for a photo that was never ingested.
+
+        Photos already linked to another flight stay there: unique_identifier is unique, so a photo belongs
+        to one flight. They are logged and returned as {unique_identifier: owning flight_id}.
+        """
+        unique_identifiers = list(unique_identifiers)
+        if not unique_identifiers:
+            return {}
+        if flight.flight_id is None:
+            db.flush()
+
+        ingested = set()
+        owned_elsewhere = {}
+        for start in range(0, len(unique_identifiers), SQLITE_MAX_VARIABLES):
+            chunk = unique_identifiers[start:start + SQLITE_MAX_VARIABLES]
+            for unique_identifier, flight_id in db.execute(select(Photo.unique_identifier, Photo.flight_id).where(Photo.unique_identifier.in_(chunk))):
+                ingested.add(unique_identifier)
+                if flight_id is not None and flight_id != flight.flight_id:
+                    owned_elsewhere[unique_identifier] = flight_id
+            db.execute(update(Photo).where(Photo.unique_identifier.in_(chunk))
+                       .where(Photo.flight_id.is_(None) | (Photo.flight_id == flight.flight_id))
+                       .values(flight_id=flight.flight_id))
+
+        for unique_identifier, flight_id in owned_elsewhere.items():
+            print(f"Warning: photo {unique_identifier} already belongs to flight {flight_id}; not adding it to flight {flight.flight_id} ({flight.flight_name})")
+        missing = [unique_identifier for unique_identifier in unique_identifiers if unique_identifier not in ingested]
+        db.add_all([Photo(flight_id=flight.flight_id, filename=unique_identifier, unique_identifier=unique_identifier, photo_metadata={})
+                    for unique_identifier in missing])
+        # The collection is never loaded just to append; reload it on next access
+        db.expire(flight, ['photos'])
+        return owned_elsewhere
 
     @staticmethod
     def add_system_flight_audit_entry(db, site_inspection, flight, timestamp):
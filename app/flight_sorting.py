@@ -1,20 +1,23 @@
 
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Union, Optional
+from datetime import datetime
 from .utils import Utilities
+from .metadata_store import PhotoMetadataStore
 
 
 
 
 
 class FlightSorter:
-    def __init__(self, flight_data: List[Dict[str, Any]], passfail_list: List[Dict[str, Any]]):
+    def __init__(self, flight_data: Union[List[Dict[str, Any]], pd.DataFrame], passfail_list: List[Dict[str, Any]]):
         print(f"FlightSorter init: {len(flight_data)} items")
         
         
         
-        self.flight_data = pd.DataFrame(flight_data)
+        # A DataFrame (e.g. read from the Parquet metadata store) is used as-is, no per-row dict round-trip
+        self.flight_data = flight_data.copy() if isinstance(flight_data, pd.DataFrame) else pd.DataFrame(flight_data)
         #print('dataframe contents:', self.flight_data)
         self.passfail_list = passfail_list
         self.photo_count_requirement = {
@@ -33,6 +36,12 @@ class FlightSorter:
         # Add standard dimensions for DJI Mavic 3
         self.standard_width = 5280  # Update this with the correct width
         
+    @classmethod
+    def from_metadata_store(cls, path: str, site_ids: Optional[List[str]] = None, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None) -> 'FlightSorter':
+        flight_data = PhotoMetadataStore.read_dataframe(path, site_ids=site_ids, start_date=start_date, end_date=end_date)
+        return cls(flight_data, [])
+
     def segment_flights_by_time(self, category_data: pd.DataFrame, time_threshold: int = 10, height_threshold: float = 5.0, heading_threshold: float = 10.0) -> List[pd.DataFrame]:
         print(f"Segmenting flights for category with {len(category_data)} photos")
         segments = []
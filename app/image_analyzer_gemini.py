@@ -19,6 +19,11 @@ class ImageAnalyzerGemini:
         self.model_flash = genai.GenerativeModel('gemini-1.5-flash')
         self.model_pro = genai.GenerativeModel('gemini-1.5-pro')
         self.assets_folder = assets_folder
+        self.calls_issued = 0
+
+    def generate(self, model, contents):
+        self.calls_issued += 1
+        return model.generate_content(contents)
 
     def get_reference_photos(self, category: str) -> List[str]:
         category_folder = os.path.join(self.assets_folder, category)
@@ -36,23 +41,23 @@ class ImageAnalyzerGemini:
             # Step 1: Confirm what it sees in the main image
             main_image = PIL.Image.open(image_path)
             step1_prompt = "Describe what you see in this image concisely."
-            step1_response = model.generate_content([step1_prompt, main_image])
+            step1_response = self.generate(model, [step1_prompt, main_image])
             #print(f"Main image description: {step1_response.text.strip()}")
 
             if reference_image_path:
                 # Step 1b: Confirm what it sees in the reference image
                 reference_image = PIL.Image.open(reference_image_path)
                 ref_step1_prompt = "Describe what you see in this reference image concisely."
-                ref_step1_response = model.generate_content([ref_step1_prompt, reference_image])
+                ref_step1_response = self.generate(model, [ref_step1_prompt, reference_image])
                 #print(f"Reference image description: {ref_step1_response.text.strip()}")
 
                 # Step 2: Compare the images
                 step2_prompt = f"{prompt}\n\nMain image: {step1_response.text.strip()}\nReference image: {ref_step1_response.text.strip()}"
-                step2_response = model.generate_content([step2_prompt, main_image, reference_image])
+                step2_response = self.generate(model, [step2_prompt, main_image, reference_image])
             else:
                 # If no reference image, just analyze the main image
                 step2_prompt = f"{prompt}\n\nImage description: {step1_response.text.strip()}"
-                step2_response = model.generate_content([step2_prompt, main_image])
+                step2_response = self.generate(model, [step2_prompt, main_image])
 
             return step2_response.text.strip().upper()
         except Exception as e:
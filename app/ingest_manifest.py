@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+MANIFEST_VERSION = 2
+
+# Hashing the head of the file covers the EXIF/XMP block and part of the image data,
+# which is enough to tell a retake from the original without reading 20 MB per photo
+HASH_BYTES = 64 * 1024
+
+
+def default_manifest_dir() -> str:
+    # App-owned cache, never the photo folder: the pilots' share stays untouched and uploads cannot plant a manifest
+    return os.getenv('INGEST_MANIFEST_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'spotcheck', 'manifests'))
+
+
+def manifest_path_for(folder_path: str) -> str:
+    key = hashlib.blake2b(os.path.realpath(folder_path).encode(), digest_size=16).hexdigest()
+    return os.path.join(default_manifest_dir(), f"{key}.json")
+
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in the manifest")
+
+
+def decode_value(value: Dict[str, Any]) -> Any:
+    if set(value) == {'__datetime__'}:
+        return datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+class IngestManifest:
+    """On-disk cache of parsed photo metadata keyed by path, size, mtime and a content hash.
+
+    A file whose size and mtime are unchanged is reused without being opened. If only the
+    mtime changed (e.g. the folder was copied again) the content hash decides. Files moved
+    to a new folder are matched by (size, content hash, file name).
+
+    Stored as JSON under an app-owned cache directory, one file per scanned folder (manifest_path_for).
+    """
+
+    def __init__(self, manifest_path: str, keys_to_extract: List[str]):
+        self.manifest_path = manifest_path
+        self.keys_to_extract = list(keys_to_extract)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hash_index: Dict[tuple, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def content_hash(file_path: str) -> str:
+        with open(file_path, 'rb') as f:
+            return hashlib.blake2b(f.read(HASH_BYTES), digest_size=16).hexdigest()
+
+    def load(self) -> 'IngestManifest':
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                data = json.load(f, object_hook=decode_value)
+        except FileNotFoundError:
+            return self
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return self
+
+        # A manifest written for a different tag set would hand back incomplete rows
+        if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION or data.get('keys_to_extract') != self.keys_to_extract:
+            self.logger.info(f"Manifest {self.manifest_path} is out of date, rebuilding")
+            return self
+
+        self.entries = data.get('entries', {})
+        self.hash_index = {(entry['size'], entry['content_hash'], os.path.basename(path)): path for path, entry in self.entries.items()}
+        return self
+
+    def lookup(self, file_path: str, stat_result: os.stat_result) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(file_path)
+        if entry and entry['size'] == stat_result.st_size and entry['mtime_ns'] == stat_result.st_mtime_ns:
+            self.hits += 1
+            return dict(entry['metadata'])
+
+        try:
+            content_hash = self.content_hash(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        if not entry or entry['size'] != stat_result.st_size or entry['content_hash'] != content_hash:
+            moved_from = self.hash_index.get((stat_result.st_size, content_hash, os.path.basename(file_path)))
+            entry = self.entries.get(moved_from) if moved_from else None
+
+        if entry and entry['size'] == stat_result.st_size and entry['content_hash'] == content_hash:
+            self.hits += 1
+            self.record(file_path, stat_result, entry['metadata'], content_hash)
+            return dict(entry['metadata'])
+
+        self.misses += 1
+        return None
+
+    def record(self, file_path: str, stat_result: os.stat_result, metadata: Dict[str, Any], content_hash: Optional[str] = None) -> None:
+        if content_hash is None:
+            try:
+                content_hash = self.content_hash(file_path)
+            except OSError as e:
+                self.logger.warning(f"Not caching {file_path}: {e}")
+                return
+        self.entries[file_path] = {
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'content_hash': content_hash,
+            'metadata': dict(metadata)
+        }
+        self.hash_index[(stat_result.st_size, content_hash, os.path.basename(file_path))] = file_path
+        self.dirty = True
+
+    def prune(self, file_paths: List[str]) -> None:
+        """Drops entries for files that are no longer present in the scanned tree."""
+        keep = set(file_paths)
+        removed = [path for path in self.entries if path not in keep]
+        for path in removed:
+            del self.entries[path]
+        if removed:
+            self.hash_index = {key: path for key, path in self.hash_index.items() if path in keep}
+            self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        data = {'version': MANIFEST_VERSION, 'keys_to_extract': self.keys_to_extract, 'entries': self.entries}
+        temp_path = f"{self.manifest_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, default=encode_value)
+            os.replace(temp_path, self.manifest_path)
+            self.dirty = False
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Could not write manifest {self.manifest_path}: {e}")
@@ -15,15 +15,10 @@ class InspectionProcessor:
         print("PROCESSING INSPECTION DATA BEGIN...")
         
         current_timestamp = datetime.now(pytz.timezone('US/Central'))
-        site_location = SiteLocation()
-        try:
-            site_location.inspection_data = InspectionDataReader.read_inspection_data()
-        except Exception as e:
-            print(f"Error reading inspection data: {str(e)}")
-            site_location.inspection_data = []
+        inspection_data = InspectionDataReader.try_read_inspection_snapshot()
 
         site_id = next((item.get('Site ID', 'Unknown') for item in processed_metadata), 'Unknown')
-        inspection_id = str(next((item.get('Inspection', 'Unknown') for item in site_location.inspection_data if item.get('Site ID') == site_id), 'Unknown'))
+        inspection_id = str(inspection_data.lookup(site_id, 'Inspection'))
         inspection = InspectionProcessor.get_or_create_inspection(db, inspection_id)
 
         processed_site_ids = set()  # Track processed site IDs
@@ -33,14 +28,14 @@ class InspectionProcessor:
             if site_id in processed_site_ids:
                 continue  # Skip if already processed
 
-            scope_requirement = next((item.get('Scope Package', 'Unknown') for item in site_location.inspection_data if item.get('Site ID') == site_id), 'Unknown')
+            scope_requirement = inspection_data.lookup(site_id, 'Scope Package')
             site_inspection = InspectionProcessor.get_or_create_site_inspection(db, inspection, site_id, scope_requirement)
             FlightProcessor.process_flights(db, site_inspection, passfail_list, flight_requirements, current_timestamp)
             processed_site_ids.add(site_id)  # Mark as processed
 
         
         
-        AuditManager.clear_and_add_audit_entries(db, inspection, flight_requirements, current_timestamp)
+        AuditManager.add_audit_transitions(db, inspection, flight_requirements, current_timestamp)
         print("PROCESSING INSPECTION DATA END...")
         return inspection
 
@@ -1,48 +1,181 @@
 from google.cloud import storage
 import pandas as pd
 import io
-from typing import List, Dict, Any
+import os
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 import json
+import hashlib
 from google.api_core import exceptions
+from .dji_data_extraction import SiteLocation
+
+FLIGHT_REQUIREMENTS_NAME = "flight_requirements.json"
+# Provide a default set of flight requirements
+DEFAULT_FLIGHT_REQUIREMENTS = {
+    "Default": [
+        "uplook, downlook, center in, top down, cable anchor, tower flight Type 2, compound flight upper, compound flight lower"
+    ]
+}
+
+
+class InspectionDataSnapshot:
+    """One parsed version of the inspection spreadsheet, shared by every caller in the process."""
+
+    def __init__(self, version: Tuple[str, Any], records: List[Dict[str, Any]]):
+        self.version = version
+        self.records = records
+        self.by_site_id: Dict[Any, Dict[str, Any]] = {}
+        for record in records:
+            # First row wins, matching the next(...) scans this replaces
+            self.by_site_id.setdefault(record.get('Site ID'), record)
+
+    def get(self, site_id: Any) -> Optional[Dict[str, Any]]:
+        return self.by_site_id.get(site_id)
+
+    def lookup(self, site_id: Any, key: str, default: Any = 'Unknown') -> Any:
+        record = self.by_site_id.get(site_id)
+        return record.get(key, default) if record is not None else default
+
+    def site_location(self) -> SiteLocation:
+        site_location = SiteLocation()
+        site_location.inspection_data = self.records
+        site_location.inspection_data_version = self.version
+        return site_location
+
+
+class GCSInspectionDataBackend:
+    def __init__(self, bucket_name: str = "inspection-data"):
+        self.bucket_name = bucket_name
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def latest_excel(self) -> Tuple[str, Any]:
+        """Returns (name, generation) of the most recent Excel file using listing metadata only."""
+        excel_blobs = [blob for blob in self.bucket.list_blobs() if blob.name.endswith('.xlsx')]
+        if not excel_blobs:
+            raise FileNotFoundError("No Excel files found in the bucket.")
+        most_recent_blob = max(excel_blobs, key=lambda blob: blob.time_created)
+        return most_recent_blob.name, most_recent_blob.generation
 
+    def download(self, name: str, generation: Any) -> bytes:
+        return self.bucket.blob(name, generation=generation).download_as_bytes()
 
-class InspectionDataReader:
-    def __init__(self):
-        self.storage_client = storage.Client()
-        
-        
-    @staticmethod
-    def read_inspection_data() -> List[Dict[str, Any]]:
-        # Initialize the Google Cloud Storage client
-        storage_client = storage.Client()
+    def read_flight_requirements(self) -> str:
+        try:
+            return self.bucket.blob(FLIGHT_REQUIREMENTS_NAME).download_as_text()
+        except exceptions.NotFound:
+            raise FileNotFoundError(f"{FLIGHT_REQUIREMENTS_NAME} not found in {self.bucket_name}")
 
-        # Replace with your actual bucket name
-        bucket_name = "inspection-data"
-        bucket = storage_client.bucket(bucket_name)
 
-        # List all blobs (files) in the bucket
-        blobs = list(bucket.list_blobs())
+class LocalInspectionDataBackend:
+    """Reads inspection spreadsheets from a local directory; mtime stands in for the GCS generation."""
 
-        # Filter for Excel files and sort by creation time (most recent first)
-        excel_blobs = [blob for blob in blobs if blob.name.endswith('.xlsx')]
-        excel_blobs.sort(key=lambda x: x.time_created, reverse=True)
+    def __init__(self, directory: str):
+        self.directory = directory
 
-        if not excel_blobs:
-            raise FileNotFoundError("No Excel files found in the bucket.")
+    def latest_excel(self) -> Tuple[str, Any]:
+        with os.scandir(self.directory) as entries:
+            excel_files = [(entry.stat().st_mtime_ns, entry.name) for entry in entries if entry.name.endswith('.xlsx') and entry.is_file()]
+        if not excel_files:
+            raise FileNotFoundError(f"No Excel files found in {self.directory}.")
+        generation, name = max(excel_files)
+        return name, generation
 
-        # Get the most recent Excel file
-        most_recent_blob = excel_blobs[0]
+    def download(self, name: str, generation: Any) -> bytes:
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
 
-        # Download the contents of the blob as bytes
-        content = most_recent_blob.download_as_bytes()
+    def read_flight_requirements(self) -> str:
+        with open(os.path.join(self.directory, FLIGHT_REQUIREMENTS_NAME)) as f:
+            return f.read()
 
-        # Use pandas to read the Excel content
-        df = pd.read_excel(io.BytesIO(content))
 
-        # Convert to list of dictionaries
-        inspection_data = df.to_dict('records')
+class InspectionDataReader:
+    # Process-wide cache of the parsed spreadsheet, keyed on (blob name, generation)
+    _snapshot: Optional[InspectionDataSnapshot] = None
+    _checked_at: float = 0.0
+    _lock = threading.Lock()
+    _backend = None
+    cache_ttl_seconds = float(os.getenv('INSPECTION_DATA_TTL', '60'))
+    # (inspection data version, flight requirements version, monotonic time checked) for the request path
+    _versions: Optional[Tuple[Any, str, float]] = None
+    _versions_refresh: Optional[threading.Thread] = None
+    _versions_lock = threading.Lock()
 
-        return inspection_data
+    def __init__(self):
+        self.storage_client = storage.Client()
+
+    @classmethod
+    def get_backend(cls):
+        if cls._backend is None:
+            local_directory = os.getenv('INSPECTION_DATA_DIR')
+            cls._backend = LocalInspectionDataBackend(local_directory) if local_directory else GCSInspectionDataBackend()
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        with cls._lock:
+            cls._backend = backend
+            cls._snapshot = None
+            cls._checked_at = 0.0
+            cls._versions = None
+
+    @classmethod
+    def read_inspection_snapshot(cls) -> InspectionDataSnapshot:
+        """Returns the cached spreadsheet, revalidating against the newest blob's generation at most once per TTL."""
+        with cls._lock:
+            now = time.monotonic()
+            if cls._snapshot is not None and now - cls._checked_at < cls.cache_ttl_seconds:
+                return cls._snapshot
+
+            backend = cls.get_backend()
+            version = backend.latest_excel()
+            if cls._snapshot is None or cls._snapshot.version != version:
+                print(f"Loading inspection data {version[0]} (generation {version[1]})")
+                content = backend.download(*version)
+                df = pd.read_excel(io.BytesIO(content))
+                cls._snapshot = InspectionDataSnapshot(version, df.to_dict('records'))
+            cls._checked_at = now
+            return cls._snapshot
+
+    @classmethod
+    def try_read_inspection_snapshot(cls) -> InspectionDataSnapshot:
+        try:
+            return cls.read_inspection_snapshot()
+        except Exception as e:
+            print(f"Error reading inspection data: {str(e)}")
+            return InspectionDataSnapshot(None, [])
+
+    @classmethod
+    def refresh_versions(cls) -> None:
+        try:
+            snapshot = cls.read_inspection_snapshot()
+            requirements_version = cls.flight_requirements_version()
+        except Exception as e:
+            print(f"Error refreshing inspection data versions: {str(e)}")
+            return
+        cls._versions = (snapshot.version, requirements_version, cls._checked_at)
+
+    @classmethod
+    def cached_versions(cls) -> Optional[Tuple[Any, str]]:
+        """Returns (inspection data version, flight requirements version) if both were checked within the TTL, else None.
+
+        Never blocks on storage: a missing or expired entry is refreshed on a background thread for later callers.
+        """
+        versions = cls._versions
+        if versions is not None and time.monotonic() - versions[2] < cls.cache_ttl_seconds:
+            return versions[0], versions[1]
+        # Not cls._lock: that one is held while the spreadsheet downloads
+        with cls._versions_lock:
+            if cls._versions_refresh is None or not cls._versions_refresh.is_alive():
+                cls._versions_refresh = threading.Thread(target=cls.refresh_versions, name='inspection-versions', daemon=True)
+                cls._versions_refresh.start()
+        return None
+
+    @staticmethod
+    def read_inspection_data() -> List[Dict[str, Any]]:
+        # The list is shared between callers through the cache; treat it as read-only
+        return InspectionDataReader.read_inspection_snapshot().records
     
     def print_bucket_info(self):
         """Prints available buckets and their contents."""
@@ -56,41 +189,30 @@ class InspectionDataReader:
                 print(f"    - {blob.name}")
 
 
+    @staticmethod
+    def flight_requirements_version() -> str:
+        """Digest of the flight requirements file; raises if it cannot be read, unlike load_flight_requirements."""
+        try:
+            flight_requirements = json.loads(InspectionDataReader.get_backend().read_flight_requirements())
+        except FileNotFoundError:
+            flight_requirements = DEFAULT_FLIGHT_REQUIREMENTS
+        return hashlib.blake2b(json.dumps(flight_requirements, sort_keys=True).encode(), digest_size=16).hexdigest()
+
     @staticmethod
     def load_flight_requirements() -> Dict[str, List[str]]:
-        # Initialize the Google Cloud Storage client
-        storage_client = storage.Client()
-
-        bucket_name = "inspection-data"
-        bucket = storage_client.bucket(bucket_name)
-        print(f"Accessing bucket: {bucket_name}")
-
-        # Specify the name of your JSON file in the bucket
-        blob_name = "flight_requirements.json"
-        blob = bucket.blob(blob_name)
-        print(f"Reading file: {blob_name}")
-        
+        print(f"Reading file: {FLIGHT_REQUIREMENTS_NAME}")
         try:
-            # Download the contents of the blob as string
-            json_string = blob.download_as_text()
+            # Download the contents of the file as string
+            json_string = InspectionDataReader.get_backend().read_flight_requirements()
 
             # Parse the JSON string
             flight_requirements = json.loads(json_string)
 
-        except exceptions.NotFound:
-            print(f"Warning: {blob_name} not found in {bucket_name}. Using default flight requirements.")
-            # Provide a default set of flight requirements
-            flight_requirements = {
-                "Default": [
-                    "uplook, downlook, center in, top down, cable anchor, tower flight Type 2, compound flight upper, compound flight lower"
-                ]
-            }
+        except FileNotFoundError:
+            print(f"Warning: {FLIGHT_REQUIREMENTS_NAME} not found. Using default flight requirements.")
+            flight_requirements = DEFAULT_FLIGHT_REQUIREMENTS
         except Exception as e:
             print(f"Error loading flight requirements: {str(e)}. Using default flight requirements.")
-            flight_requirements = {
-                "Default": [
-                    "uplook, downlook, center in, top down, cable anchor, tower flight Type 2, compound flight upper, compound flight lower"
-                ]
-            }
+            flight_requirements = DEFAULT_FLIGHT_REQUIREMENTS
 
-        return flight_requirements
\ No newline at end of file
+        return flight_requirements
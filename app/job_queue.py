@@ -0,0 +1,268 @@
+import json
+import time
+import uuid
+import sqlite3
+import traceback
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# A job still 'running' after this long is taken to belong to a worker that died
+DEFAULT_JOB_TIMEOUT = 3600
+
+
+class JobStore:
+    """Jobs and their stage events in a local SQLite file, shared by every worker thread and process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    fingerprint TEXT
+                )""")
+            # Job stores created before fingerprints existed
+            if 'fingerprint' not in {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}:
+                connection.execute("ALTER TABLE jobs ADD COLUMN fingerprint TEXT")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    details TEXT,
+                    created_at REAL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_job_events_job_id ON job_events (job_id, event_id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_jobs_fingerprint ON jobs (fingerprint, created_at)")
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def create(self, payload: Any, fingerprint: Optional[str] = None, ttl_seconds: float = 0,
+               job_timeout: float = DEFAULT_JOB_TIMEOUT) -> Tuple[str, bool]:
+        """Returns (job_id, created).
+
+        With a fingerprint and a positive ttl_seconds, a queued job with the same fingerprint, one running
+        for less than job_timeout, or one that finished successfully within ttl_seconds, is returned
+        instead of creating a new one.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self.connect()) as connection, connection:
+            if fingerprint and ttl_seconds > 0:
+                # Take the write lock before looking, so two identical requests cannot both create a job
+                connection.execute("BEGIN IMMEDIATE")
+                self.fail_stale_running(connection, job_timeout, now)
+                connection.execute("UPDATE jobs SET fingerprint = NULL WHERE fingerprint IS NOT NULL AND finished_at < ?", (now - ttl_seconds,))
+                row = connection.execute("SELECT job_id FROM jobs WHERE fingerprint = ? AND status IN (?, ?, ?) ORDER BY created_at DESC LIMIT 1",
+                                         (fingerprint, JOB_QUEUED, JOB_RUNNING, JOB_DONE)).fetchone()
+                if row is not None:
+                    return row['job_id'], False
+            connection.execute("INSERT INTO jobs (job_id, status, payload, created_at, fingerprint) VALUES (?, ?, ?, ?, ?)",
+                               (job_id, JOB_QUEUED, json.dumps(payload, default=str), now, fingerprint))
+        return job_id, True
+
+    @staticmethod
+    def fail_stale_running(connection: sqlite3.Connection, job_timeout: float, now: float) -> int:
+        return connection.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND started_at < ?",
+                                  (JOB_FAILED, f"Abandoned: still running after {job_timeout:.0f}s, its worker is gone", now,
+                                   JOB_RUNNING, now - job_timeout)).rowcount
+
+    def fail_abandoned(self, job_timeout: float = DEFAULT_JOB_TIMEOUT) -> int:
+        """Fails jobs left running by a crashed or restarted worker, so they are neither reused nor waited on forever."""
+        with closing(self.connect()) as connection, connection:
+            return self.fail_stale_running(connection, job_timeout, time.time())
+
+    def claim(self, job_id: str) -> Optional[Any]:
+        """Moves a queued job to running and returns its payload, or None if another worker already took it."""
+        with closing(self.connect()) as connection, connection:
+            claimed = connection.execute("UPDATE jobs SET status = ?, started_at = ? WHERE job_id = ? AND status = ?",
+                                         (JOB_RUNNING, time.time(), job_id, JOB_QUEUED)).rowcount
+            if not claimed:
+                return None
+            row = connection.execute("SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row['payload'])
+
+    def add_event(self, job_id: str, stage: str, details: Dict[str, Any]) -> None:
+        now = time.time()
+        with closing(self.connect()) as connection, connection:
+            connection.execute("INSERT INTO job_events (job_id, stage, details, created_at) VALUES (?, ?, ?, ?)",
+                               (job_id, stage, json.dumps(details, default=str), now))
+            connection.execute("UPDATE jobs SET stage = ? WHERE job_id = ?", (stage, job_id))
+
+    def finish(self, job_id: str, result: Any) -> None:
+        with closing(self.connect()) as connection, connection:
+            connection.execute("UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE job_id = ?",
+                               (JOB_DONE, json.dumps(result, default=str), time.time(), job_id))
+
+    def fail(self, job_id: str, error: str) -> None:
+        with closing(self.connect()) as connection, connection:
+            connection.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ? AND status != ?",
+                               (JOB_FAILED, error, time.time(), job_id, JOB_DONE))
+
+    def queued_job_ids(self) -> List[str]:
+        with closing(self.connect()) as connection:
+            return [row['job_id'] for row in connection.execute("SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at", (JOB_QUEUED,))]
+
+    def events(self, job_id: str, after_event_id: int = 0) -> List[Dict[str, Any]]:
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT event_id, stage, details, created_at FROM job_events WHERE job_id = ? AND event_id > ? ORDER BY event_id",
+                                      (job_id, after_event_id)).fetchall()
+        return [{'event_id': row['event_id'], 'stage': row['stage'], 'details': json.loads(row['details']), 'at': row['created_at']} for row in rows]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT job_id, status, stage, result, error, created_at, started_at, finished_at FROM jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row['job_id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'events': self.events(job_id),
+            'result': json.loads(row['result']) if row['result'] else None
+        }
+
+
+def execute_job(store_path: str, job_id: str, handler: Callable) -> bool:
+    """Claims and runs one job. Module-level so process-pool workers can run it."""
+    store = JobStore(store_path)
+    payload = store.claim(job_id)
+    if payload is None:
+        return False
+
+    started = last_event = time.perf_counter()
+
+    def report(stage, **details):
+        # Every event carries how long its stage took and the time since the job started
+        nonlocal last_event
+        now = time.perf_counter()
+        details.update(stage_seconds=round(now - last_event, 3), elapsed_seconds=round(now - started, 3))
+        last_event = now
+        store.add_event(job_id, stage, details)
+
+    try:
+        result = handler(payload, report)
+    except Exception as e:
+        traceback.print_exc()
+        store.fail(job_id, f"{type(e).__name__}: {e}")
+        return True
+    store.finish(job_id, result)
+    return True
+
+
+class JobQueue:
+    """Runs submitted jobs on a bounded thread or process pool, with state kept in a JobStore.
+
+    handler(payload, report) does the work and returns a JSON-serializable result; for the
+    process pool it must be a module-level function. Jobs still queued from a previous run of
+    the app are picked up again on start; jobs running for longer than job_timeout are failed.
+
+    Submissions carrying a fingerprint are deduplicated for fingerprint_ttl seconds (0 disables this).
+    """
+
+    def __init__(self, store: JobStore, handler: Callable, max_workers: int = 2, executor: str = 'thread',
+                 initializer: Callable = None, initargs: tuple = (), on_complete: Callable = None, fingerprint_ttl: float = 0,
+                 job_timeout: float = DEFAULT_JOB_TIMEOUT):
+        self.store = store
+        self.handler = handler
+        self.on_complete = on_complete
+        self.fingerprint_ttl = fingerprint_ttl
+        self.job_timeout = job_timeout
+        if executor == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        elif executor == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job', initializer=initializer, initargs=initargs)
+        else:
+            raise ValueError(f"Unknown job executor '{executor}'. Use 'thread' or 'process'.")
+
+        abandoned = store.fail_abandoned(job_timeout)
+        if abandoned:
+            print(f"Failed {abandoned} abandoned running jobs")
+        for job_id in store.queued_job_ids():
+            self.dispatch(job_id)
+
+    def submit(self, payload: Any, fingerprint: Optional[str] = None) -> Tuple[str, bool]:
+        """Returns (job_id, created); created is False when an identical job is reused."""
+        job_id, created = self.store.create(payload, fingerprint, self.fingerprint_ttl, self.job_timeout)
+        if created:
+            self.dispatch(job_id)
+        return job_id, created
+
+    def dispatch(self, job_id: str) -> None:
+        future = self.executor.submit(execute_job, self.store.path, job_id, self.handler)
+        future.add_done_callback(lambda finished: self.job_finished(job_id, finished))
+
+    def job_finished(self, job_id: str, future) -> None:
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            # The worker itself died (e.g. a crashed pool process), so execute_job could not record it
+            self.store.fail(job_id, f"{type(exception).__name__}: {exception}")
+        elif not future.result():
+            return
+        if self.on_complete:
+            try:
+                self.on_complete(job_id)
+            except Exception as e:
+                print(f"Error after job {job_id}: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def follow(self, job_id: str, after_event_id: int = 0, poll_seconds: float = 0.25, keepalive_seconds: Optional[float] = None,
+               max_seconds: Optional[float] = None) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yields the job's stage events as they are recorded, then the finished job itself (with 'status').
+
+        Yields None after keepalive_seconds without anything to report, so the caller writes and finds out about
+        clients that went away. Stops after max_seconds even if the job has not finished; followers resume
+        from the last event id they saw.
+        """
+        started = last_yielded = time.monotonic()
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            for event in self.store.events(job_id, after_event_id):
+                after_event_id = event['event_id']
+                last_yielded = time.monotonic()
+                yield event
+            if job['status'] in (JOB_DONE, JOB_FAILED):
+                # Events written between reading the job and its events were picked up above
+                job.pop('events')
+                yield job
+                return
+            now = time.monotonic()
+            if max_seconds is not None and now - started >= max_seconds:
+                return
+            if keepalive_seconds is not None and now - last_yielded >= keepalive_seconds:
+                last_yielded = now
+                yield None
+            time.sleep(poll_seconds)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
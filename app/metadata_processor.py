@@ -52,6 +52,12 @@ class MetadataProcessor:
             else:
                 print("File name not found in metadata")
 
+        # Only server-side ingest knows where the original is; browser uploads send just the name
+        for key in ['File Path', 'SourceFile', 'Source File']:
+            if metadata.get(key):
+                parsed_metadata['File Path'] = metadata[key]
+                break
+
         if 'Create Date' in parsed_metadata and 'File Name' in parsed_metadata:
             create_date = parsed_metadata['Create Date']
             if isinstance(create_date, datetime):
@@ -67,22 +73,23 @@ class MetadataProcessor:
 
 
     @staticmethod
-    def process_and_enrich_metadata(metadata_list, existing_metadata):
+    def process_and_enrich_metadata(metadata_list, existing_metadata, report=None):
         processor = MetadataProcessor()
-        site_location = SiteLocation()
-        try:
-            site_location.inspection_data = InspectionDataReader.read_inspection_data()
-        except Exception as e:
-            print(f"Error reading inspection data: {str(e)}")
-            site_location.inspection_data = []
-
-        processed_metadata = []
-        for metadata in metadata_list:
-            parsed_metadata = processor.parse_metadata(metadata)
+        site_location = InspectionDataReader.try_read_inspection_snapshot().site_location()
+
+        processed_metadata = [processor.parse_metadata(metadata) for metadata in metadata_list]
+        if report:
+            report('rows_parsed', rows=len(processed_metadata))
+        # One batch match for the whole upload instead of a nearest-site search per photo
+        site_infos = site_location.match_sites([metadata.get('GPS Latitude') for metadata in processed_metadata],
+                                               [metadata.get('GPS Longitude') for metadata in processed_metadata])
+        for parsed_metadata, site_info in zip(processed_metadata, site_infos):
             #print(f"Processing metadata entry: {parsed_metadata}")
-            site_info = site_location.find_matching_site(parsed_metadata)
+            parsed_metadata['File Name'] = parsed_metadata.get('File Name', 'Unknown File')
             parsed_metadata.update(site_info)
-            processed_metadata.append(parsed_metadata)
+        if report:
+            matched = [site_info for site_info in site_infos if site_info.get('Matched Index', -1) != -1]
+            report('sites_matched', matched=len(matched), unmatched=len(site_infos) - len(matched))
 
         
         print(f"Processed {len(processed_metadata)} metadata entries")
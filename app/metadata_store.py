@@ -0,0 +1,106 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+# Arrow schema mirroring the Photo model columns, plus the matched site for pushdown
+PHOTO_SCHEMA = pa.schema([
+    ('unique_identifier', pa.string()),
+    ('filename', pa.string()),
+    ('site_id', pa.string()),
+    ('create_date', pa.timestamp('us')),
+    ('gps_latitude', pa.float64()),
+    ('gps_longitude', pa.float64()),
+    ('gimbal_pitch_degree', pa.float64()),
+    ('flight_yaw_degree', pa.float64()),
+    ('flight_x_speed', pa.float64()),
+    ('flight_y_speed', pa.float64()),
+    ('relative_altitude', pa.float64()),
+    ('image_width', pa.int32()),
+    ('image_length', pa.int32()),
+    ('digital_zoom_ratio', pa.float64()),
+])
+
+# Metadata dict key -> store column
+METADATA_COLUMNS = {
+    'Unique Identifier': 'unique_identifier',
+    'File Name': 'filename',
+    'Site ID': 'site_id',
+    'Create Date': 'create_date',
+    'GPS Latitude': 'gps_latitude',
+    'GPS Longitude': 'gps_longitude',
+    'Gimbal Pitch Degree': 'gimbal_pitch_degree',
+    'Flight Yaw Degree': 'flight_yaw_degree',
+    'Flight X Speed': 'flight_x_speed',
+    'Flight Y Speed': 'flight_y_speed',
+    'Relative Altitude': 'relative_altitude',
+    'Image Width': 'image_width',
+    'Image Length': 'image_length',
+    'Digital Zoom Ratio': 'digital_zoom_ratio',
+}
+COLUMN_KEYS = {column: key for key, column in METADATA_COLUMNS.items()}
+
+
+class PhotoMetadataStore:
+    """Parquet store for extracted photo metadata.
+
+    Rows are sorted by site and capture time and written in modest row groups, so the
+    row-group statistics let site/date filters skip most of the file on read.
+    """
+
+    ROW_GROUP_SIZE = 2048
+
+    @staticmethod
+    def to_table(metadata_list: List[Dict[str, Any]]) -> pa.Table:
+        df = pd.DataFrame(metadata_list)
+        # exiftool reports 'Image Height'; the Photo model calls it image_length
+        if 'Image Height' in df.columns:
+            df['Image Length'] = df['Image Length'].fillna(df['Image Height']) if 'Image Length' in df.columns else df['Image Height']
+
+        columns = {}
+        for field in PHOTO_SCHEMA:
+            key = COLUMN_KEYS[field.name]
+            values = df[key] if key in df.columns else pd.Series([None] * len(df), dtype=object)
+            if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+                values = pd.to_numeric(values, errors='coerce')
+                if pa.types.is_integer(field.type):
+                    values = values.round().astype('Int64')
+            elif pa.types.is_timestamp(field.type):
+                values = pd.to_datetime(values, errors='coerce')
+            else:
+                values = values.astype(object).where(values.notna(), None).map(lambda value: value if value is None else str(value))
+            columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+
+        table = pa.Table.from_pydict(columns, schema=PHOTO_SCHEMA)
+        return table.sort_by([('site_id', 'ascending'), ('create_date', 'ascending')])
+
+    @staticmethod
+    def write(metadata_list: List[Dict[str, Any]], path: str) -> None:
+        pq.write_table(PhotoMetadataStore.to_table(metadata_list), path, row_group_size=PhotoMetadataStore.ROW_GROUP_SIZE, compression='zstd')
+
+    @staticmethod
+    def build_filters(site_ids: Optional[List[str]] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> Optional[List[tuple]]:
+        filters = []
+        if site_ids is not None:
+            filters.append(('site_id', 'in', list(site_ids)))
+        if start_date is not None:
+            filters.append(('create_date', '>=', pd.Timestamp(start_date)))
+        if end_date is not None:
+            filters.append(('create_date', '<=', pd.Timestamp(end_date)))
+        return filters or None
+
+    @staticmethod
+    def read_table(path: str, columns: Optional[List[str]] = None, site_ids: Optional[List[str]] = None,
+                   start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> pa.Table:
+        """Reads only the requested store columns, skipping row groups outside the site/date filters."""
+        filters = PhotoMetadataStore.build_filters(site_ids, start_date, end_date)
+        return pq.read_table(path, columns=columns, filters=filters, schema=PHOTO_SCHEMA)
+
+    @staticmethod
+    def read_dataframe(path: str, keys: Optional[List[str]] = None, site_ids: Optional[List[str]] = None,
+                       start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> pd.DataFrame:
+        """Same as read_table, but takes and returns metadata key names ('Create Date', ...) for FlightSorter."""
+        columns = [METADATA_COLUMNS[key] for key in keys] if keys is not None else None
+        table = PhotoMetadataStore.read_table(path, columns, site_ids, start_date, end_date)
+        return table.to_pandas().rename(columns=COLUMN_KEYS)
@@ -0,0 +1,77 @@
+"""Versioned schema migrations for the SQLite database.
+
+create_all only creates missing tables, so any change to an existing table or its indexes
+goes here as a new numbered step. The applied version lives in SQLite's PRAGMA user_version.
+Steps must be safe to re-run (IF NOT EXISTS), since DDL and the version bump are not atomic.
+"""
+
+
+def add_audit_trail_timeline_index(connection):
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_audit_trail_inspection_site_timestamp ON audit_trail (inspection_id, site_id, timestamp)")
+
+
+def add_hot_column_indexes(connection):
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_photos_flight_id_filename ON photos (flight_id, filename)")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_flights_site_id_inspection_id ON flights (site_id, inspection_id, flight_name)")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_flights_inspection_id ON flights (inspection_id)")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_flight_analysis_site_id ON flight_analysis (site_id)")
+
+
+def add_photo_file_path(connection):
+    # ADD COLUMN has no IF NOT EXISTS
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(photos)")}
+    if 'file_path' not in columns:
+        connection.exec_driver_sql("ALTER TABLE photos ADD COLUMN file_path VARCHAR")
+
+
+MIGRATIONS = [
+    (1, "Audit trail timeline index", add_audit_trail_timeline_index),
+    (2, "Indexes on photo, flight and analysis lookup columns", add_hot_column_indexes),
+    (3, "Source file path of each photo", add_photo_file_path),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# (description, query, index it must use)
+HOT_QUERIES = [
+    ("Photo by unique identifier", "SELECT photo_id FROM photos WHERE unique_identifier = 'x'", "sqlite_autoindex_photos_1"),
+    ("Photos of a flight", "SELECT photo_id, filename FROM photos WHERE flight_id = 1", "ix_photos_flight_id_filename"),
+    ("Flights of a site inspection", "SELECT flight_id, flight_name FROM flights WHERE site_id = 'x' AND inspection_id = 'y'", "ix_flights_site_id_inspection_id"),
+    ("Flights of an inspection", "SELECT flight_id FROM flights WHERE inspection_id = 'y'", "ix_flights_inspection_id"),
+    ("Flight analysis of a site", "SELECT flight_id FROM flight_analysis WHERE site_id = 'x'", "ix_flight_analysis_site_id"),
+    ("Audit trail of an inspection", "SELECT audit_id FROM audit_trail WHERE inspection_id = 'y'", "ix_audit_trail_inspection_site_timestamp"),
+    ("Audit timeline of a site", "SELECT audit_id FROM audit_trail WHERE inspection_id = 'y' AND site_id = 'x' ORDER BY timestamp", "ix_audit_trail_inspection_site_timestamp"),
+]
+
+
+def schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def stamp(engine, version=LATEST_VERSION):
+    """Marks a database created straight from the models as already up to date."""
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def run_migrations(engine):
+    with engine.begin() as connection:
+        current_version = schema_version(connection)
+        for version, description, migrate in MIGRATIONS:
+            if version <= current_version:
+                continue
+            print(f"Applying migration {version}: {description}")
+            migrate(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+    return LATEST_VERSION
+
+
+def check_query_plans(engine):
+    """Runs EXPLAIN QUERY PLAN for each hot query. Returns (description, plan) for those not using their index."""
+    failures = []
+    with engine.connect() as connection:
+        for description, query, index_name in HOT_QUERIES:
+            plan = ' | '.join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}"))
+            if index_name not in plan:
+                failures.append((description, plan))
+    return failures
+
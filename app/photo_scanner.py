@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Tuple, Dict, Any, Optional
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class PhotoScanner:
+    """Finds image files under a folder with os.scandir, stat-ing each file exactly once.
+
+    Subfolders are listed in parallel, which hides per-directory latency on network shares.
+    The DirEntry stat results are returned so callers never need a second stat per file.
+    """
+
+    def __init__(self, extensions: Tuple[str, ...] = IMAGE_EXTENSIONS, max_workers: Optional[int] = None):
+        self.extensions = frozenset(extension.lower() for extension in extensions)
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.last_scan_stats: Dict[str, Any] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def scan_directory(self, directory: str) -> Tuple[List[Tuple[str, os.stat_result]], List[str]]:
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in self.extensions and entry.is_file():
+                            files.append((entry.path, entry.stat()))
+                    except OSError as e:
+                        self.logger.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            self.logger.warning(f"Cannot list {directory}: {e}")
+        return files, subdirectories
+
+    def scan(self, folder_path: str) -> List[Tuple[str, os.stat_result]]:
+        start_time = time.perf_counter()
+        found_files = []
+        directory_count = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self.scan_directory, folder_path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirectories = future.result()
+                    directory_count += 1
+                    found_files.extend(files)
+                    pending.update(executor.submit(self.scan_directory, subdirectory) for subdirectory in subdirectories)
+
+        elapsed = time.perf_counter() - start_time
+        self.last_scan_stats = {
+            'files': len(found_files),
+            'directories': directory_count,
+            'seconds': elapsed,
+            'files_per_second': len(found_files) / elapsed if elapsed > 0 else 0.0
+        }
+        print(f"Discovered {len(found_files)} photos in {directory_count} folders in {elapsed:.2f}s ({self.last_scan_stats['files_per_second']:.0f} files/sec)")
+        return found_files
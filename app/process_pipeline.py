@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import tempfile
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from .metadata_processor import MetadataProcessor
+from .flight_analyzer import FlightAnalyzer
+from .utils import create_inspection_dict
+from .flight_models import Inspection, SiteInspection, Flight, Photo
+from sqlalchemy.orm import joinedload, selectinload
+from .flight_sorting import FlightSorter
+from .inspection_processor import InspectionProcessor
+from .database_loader import DatabaseLoader
+from .database import DatabaseManager
+from .inspection_reader import InspectionDataReader
+from .audit_manager import AuditManager
+from .job_queue import JobQueue, JobStore, JOB_DONE
+from .thumbnail_cache import ThumbnailCache, photo_source_path
+
+
+def no_report(stage, **details):
+    pass
+
+
+class InspectionPipeline:
+    """The /process pipeline: enrich and match metadata, sort flights, analyze, and store the inspection."""
+
+    @staticmethod
+    def run(db_manager, metadata_list, report=no_report):
+        """Runs the pipeline for one uploaded metadata list and returns the inspection dict.
+
+        report(stage, **details) is called as each stage finishes.
+        """
+        print(f"Received {len(metadata_list)} metadata items")
+        print(f"First item: {metadata_list[0]}")
+        with db_manager.get_db() as db:
+            db_loader = DatabaseLoader(db)
+
+            # Get unique identifiers from the incoming metadata
+            unique_identifiers = [item.get('Unique Identifier', item.get('unique_identifier')) for item in metadata_list]
+            print(f"Found {len(unique_identifiers)} unique identifiers")
+
+            # Fetch existing metadata from the database
+            existing_photos = db_loader.get_existing_photos(unique_identifiers)
+            print(f"Found {len(existing_photos)} existing photos")
+
+            # Merge existing metadata with incoming metadata
+            processor = MetadataProcessor()
+            merged_metadata = processor.process_and_enrich_metadata(metadata_list, existing_photos, report)
+
+        # Process the MERGED metadata
+        sorter = FlightSorter(merged_metadata, [])
+        flight_data_df, passfail_list = sorter.process_flight_data()
+        report('flights_segmented', flights=len(passfail_list))
+
+        with db_manager.get_db() as db, AuditManager.batch(db):
+            analyzer = FlightAnalyzer(db, flight_data_df, passfail_list, report)
+            print(f"Running flight analysis")
+            analyzer.run_analysis()
+
+            flight_requirements = InspectionDataReader.load_flight_requirements()
+
+            inspection_id = analyzer.populate_flight_analysis_result(merged_metadata, passfail_list, flight_requirements)
+            print(f"Inspection ID: {inspection_id}")
+
+            # Ingest the photo rows first, so flights link to them instead of storing their own copies
+            db_loader = DatabaseLoader(db)
+            load_counts = db_loader.load_metadata(merged_metadata)
+            report('photos_loaded', **load_counts)
+
+            inspection = InspectionProcessor.process_inspection(db, merged_metadata, passfail_list, flight_requirements)
+            print(f"Inspection processed: {inspection}")
+
+            inspection = db.query(Inspection).options(
+                joinedload(Inspection.sites).joinedload(SiteInspection.flights).joinedload(Flight.analysis),
+                joinedload(Inspection.sites).joinedload(SiteInspection.flights).selectinload(Flight.photos)
+            ).get(inspection_id)
+            print(f"Retrieved inspection: {inspection}")
+
+            inspection_dict = create_inspection_dict(inspection)
+            print("Inspection Dict final:", inspection_dict)
+        report('db_committed', inspection_id=inspection_id)
+
+        return inspection_dict
+
+    @staticmethod
+    def pregenerate_thumbnails(db_manager, inspection_dict, max_workers):
+        """Renders review thumbnails for every photo of a finished inspection whose original is under PHOTO_ROOT."""
+        flight_ids = [flight['flight_id'] for site in inspection_dict.get('sites', []) for flight in site['flights']]
+        with db_manager.get_db() as db:
+            rows = db.query(Photo.unique_identifier, Photo.filename, Photo.file_path).filter(Photo.flight_id.in_(flight_ids)).all() if flight_ids else []
+        photos = [(unique_identifier or filename, photo_source_path(file_path, filename)) for unique_identifier, filename, file_path in rows]
+        photos = [(unique_identifier, source_path) for unique_identifier, source_path in photos if source_path]
+        thumbnail_counts = ThumbnailCache.default().pregenerate(photos, max_workers=max_workers)
+        print(f"Thumbnails for inspection {inspection_dict.get('inspection_id')}: {thumbnail_counts}")
+
+    @staticmethod
+    def fingerprint(metadata_list):
+        """Identifies a /process request by its photos and the inspection data and flight requirements it
+        would be checked against. Only cached versions are used, since this runs on the request path; None
+        when they are not cached yet, so such runs are never reused."""
+        versions = InspectionDataReader.cached_versions()
+        if versions is None:
+            return None
+        inspection_data_version, flight_requirements_version = versions
+        unique_identifiers = sorted(str(item.get('Unique Identifier', item.get('unique_identifier'))) for item in metadata_list)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([unique_identifiers, inspection_data_version, flight_requirements_version], default=str).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def create_job_queue(db_manager):
+        """Job queue for /process, configured from PROCESS_JOB_EXECUTOR, PROCESS_JOB_WORKERS, JOB_DB_PATH,
+        PROCESS_FINGERPRINT_TTL (seconds an identical request reuses a finished run; 0 disables reuse)
+        and PROCESS_JOB_TIMEOUT (seconds after which a still-running job counts as abandoned)."""
+        store = JobStore(os.getenv('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'spotcheck_jobs.db')))
+        executor = os.getenv('PROCESS_JOB_EXECUTOR', 'thread')
+        max_workers = int(os.getenv('PROCESS_JOB_WORKERS', '2'))
+        fingerprint_ttl = float(os.getenv('PROCESS_FINGERPRINT_TTL', '3600'))
+        job_timeout = float(os.getenv('PROCESS_JOB_TIMEOUT', '3600'))
+        thumbnail_workers = int(os.getenv('THUMBNAIL_PREGENERATE_WORKERS', str(os.cpu_count() or 1)))
+        # Thumbnails are rendered after the job has returned its result, one inspection at a time
+        thumbnail_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails') if thumbnail_workers > 0 else None
+
+        def render_thumbnails(inspection_dict):
+            try:
+                InspectionPipeline.pregenerate_thumbnails(db_manager, inspection_dict, thumbnail_workers)
+            except Exception as e:
+                print(f"Error pre-rendering thumbnails: {e}")
+
+        # One upload per job, once everything it wrote is committed
+        def checkpoint(job_id):
+            db_manager.checkpoint()
+            job = store.get(job_id)
+            if thumbnail_executor is not None and job and job['status'] == JOB_DONE and job['result']:
+                thumbnail_executor.submit(render_thumbnails, job['result'])
+
+        if executor == 'process':
+            initargs = (db_manager.bucket_name, db_manager.db_filename, db_manager.engine_profile, db_manager.local_db_path)
+            return JobQueue(store, run_pipeline_job, max_workers, 'process', initializer=init_pipeline_worker, initargs=initargs,
+                            on_complete=checkpoint, fingerprint_ttl=fingerprint_ttl, job_timeout=job_timeout)
+        return JobQueue(store, partial(InspectionPipeline.run, db_manager), max_workers, executor, on_complete=checkpoint,
+                        fingerprint_ttl=fingerprint_ttl, job_timeout=job_timeout)
+
+
+# Process-pool workers keep their own engine over the shared local database file;
+# the parent process owns replication and uploads once each job finishes
+_worker_db_manager = None
+
+
+def init_pipeline_worker(bucket_name, db_filename, engine_profile, local_db_path):
+    global _worker_db_manager
+    _worker_db_manager = DatabaseManager(bucket_name, db_filename, engine_profile=engine_profile, replicate=False)
+    _worker_db_manager.local_db_path = local_db_path
+    _worker_db_manager.connect()
+
+
+def run_pipeline_job(metadata_list, report):
+    return InspectionPipeline.run(_worker_db_manager, metadata_list, report)
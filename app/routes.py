@@ -1,4 +1,4 @@
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, url_for, Response, stream_with_context
 from .metadata_processor import MetadataProcessor
 from .flight_analyzer import FlightAnalyzer
 from .utils import create_inspection_dict, export_flight_data, print_db_contents
@@ -14,8 +14,20 @@ from PIL import Image
 import os
 from .plotter import Plotter
 from .inspection_reader import InspectionDataReader
+from .process_pipeline import InspectionPipeline
+from .job_queue import JOB_QUEUED, JOB_DONE
+from .thumbnail_cache import ThumbnailCache, DEFAULT_SIZE, THUMBNAIL_SIZES, photo_source_path
+from .contact_sheet import ContactSheetBuilder, CONTACT_SHEET_SIZES, CONTACT_SHEET_FORMATS
+
+def setup_routes(app, db_manager, job_queue=None):
+    # Runs /process in the background so large uploads never hit the worker timeout
+    job_queue = job_queue or InspectionPipeline.create_job_queue(db_manager)
+    # An event stream holds a worker, so it writes a keepalive while idle and ends after a while; clients reconnect
+    events_keepalive_seconds = float(os.getenv('JOB_EVENTS_KEEPALIVE_SECONDS', '15'))
+    events_max_seconds = float(os.getenv('JOB_EVENTS_MAX_SECONDS', '300'))
+    thumbnail_cache = ThumbnailCache.default()
+    contact_sheets = ContactSheetBuilder.default()
 
-def setup_routes(app, db_manager):
     @app.route('/')
     def index() -> str:
         return render_template('index.html')
@@ -23,105 +35,109 @@ def setup_routes(app, db_manager):
     @app.route('/process', methods=['POST'])
     def process_metadata():
         metadata_list = request.json
-        print(f"Received {len(metadata_list)} metadata items")
-        print(f"First item: {metadata_list[0]}")
-        with db_manager.get_db() as db:
-            db_loader = DatabaseLoader(db)
-            
-            # Get unique identifiers from the incoming metadata
-            unique_identifiers = [item.get('Unique Identifier', item.get('unique_identifier')) for item in metadata_list] 
-            print(f"Found {len(unique_identifiers)} unique identifiers")
-
-            # Fetch existing metadata from the database
-        
-            existing_photos = db_loader.get_existing_photos(unique_identifiers)
-            print(f"Found {len(existing_photos)} existing photos")
-            
-            
-            # Merge existing metadata with incoming metadata
-            processor = MetadataProcessor()
-            merged_metadata = processor.process_and_enrich_metadata(metadata_list, existing_photos)
-            
-            # --- Moved db_loader.load_metadata call ---
-
-        # Process the MERGED metadata
-        sorter = FlightSorter(merged_metadata, [])
-        flight_data_df, passfail_list = sorter.process_flight_data()
-        
-        with db_manager.get_db() as db:
-            analyzer = FlightAnalyzer(db, flight_data_df, passfail_list)
-            print(f"Running flight analysis")
-            analyzer.run_analysis()
-
-            
-            # # --- Print bucket information here ---
-            # reader = InspectionDataReader()
-            # reader.print_bucket_info() 
-            
-            
-            flight_requirements = InspectionDataReader.load_flight_requirements()
-
-    
-            inspection_id = analyzer.populate_flight_analysis_result(merged_metadata, passfail_list, flight_requirements)
-            print(f"Inspection ID: {inspection_id}")
-
-            # Call process_inspection here
-            inspection = InspectionProcessor.process_inspection(db, merged_metadata, passfail_list, flight_requirements)
-            print(f"Inspection processed: {inspection}")
-
-            inspection = db.query(Inspection).options(
-                joinedload(Inspection.sites).joinedload(SiteInspection.flights).joinedload(Flight.analysis)
-            ).get(inspection_id)
-            print(f"Retrieved inspection: {inspection}")
-
-            inspection_dict = create_inspection_dict(inspection)
-            print(f"Created inspection dict: {inspection_dict}")
-
-            # Now load the metadata into the database
-            db_loader.load_metadata(merged_metadata) 
-
-
-            #export_flight_data(flight_data_df, passfail_list)
-
-            json_output = json.dumps(inspection_dict, indent=4, default=str)
-            #print(json_output)
-
-            #print_db_contents(db)
-            
-
-            
-            
-            print("Inspection Dict final:", inspection_dict) 
-            return jsonify(inspection_dict), 200 
-        
-
-
-
+        if not metadata_list:
+            return jsonify({'error': 'Expected a non-empty list of photo metadata'}), 400
+        # Resubmitting the same batch returns the finished result or attaches to the run already in flight
+        fingerprint = InspectionPipeline.fingerprint(metadata_list) if job_queue.fingerprint_ttl > 0 else None
+        job_id, created = job_queue.submit(metadata_list, fingerprint)
+        links = {'job_id': job_id, 'status_url': url_for('get_job', job_id=job_id), 'events_url': url_for('stream_job_events', job_id=job_id)}
+        if created:
+            print(f"Queued job {job_id} for {len(metadata_list)} metadata items")
+            return jsonify({**links, 'status': JOB_QUEUED}), 202
+
+        job = job_queue.get(job_id)
+        print(f"Reusing job {job_id} ({job['status']}) for {len(metadata_list)} metadata items")
+        if job['status'] == JOB_DONE:
+            return jsonify({**links, 'status': JOB_DONE, 'reused': True, 'result': job['result']}), 200
+        return jsonify({**links, 'status': job['status'], 'reused': True}), 202
+
+    @app.route('/jobs/<job_id>')
+    def get_job(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': f'Unknown job {job_id}'}), 404
+        return jsonify(job), 200
+
+    @app.route('/jobs/<job_id>/events')
+    def stream_job_events(job_id):
+        # Server-sent events by default; ?format=jsonl gives one JSON object per line for scripts
+        if job_queue.get(job_id) is None:
+            return jsonify({'error': f'Unknown job {job_id}'}), 404
+        after_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+        as_json_lines = request.args.get('format') == 'jsonl'
+
+        def generate():
+            for event in job_queue.follow(job_id, after_event_id, keepalive_seconds=events_keepalive_seconds, max_seconds=events_max_seconds):
+                if event is None:
+                    yield '\n' if as_json_lines else ': keepalive\n\n'
+                elif as_json_lines:
+                    yield json.dumps(event) + '\n'
+                elif 'event_id' in event:
+                    yield f"id: {event['event_id']}\nevent: stage\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+
+        mimetype = 'application/x-ndjson' if as_json_lines else 'text/event-stream'
+        return Response(stream_with_context(generate()), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @app.route('/get_photo/<unique_identifier>')
     def get_photo(unique_identifier):
-        with db_manager.get_db() as db:
-            photo = db.query(Photo).filter_by(unique_identifier=unique_identifier).first()
-            if photo and photo.file_path:
-                try:
-                    # Ensure the path is absolute and normalized
-                    file_path = os.path.abspath(os.path.normpath(photo.file_path))
-                    
-                    if os.path.exists(file_path):
-                        with open(file_path, 'rb') as img_file:
-                            img = Image.open(img_file)
-                            img.thumbnail((150, 150))
-
-                            img_byte_arr = io.BytesIO()
-                            img.save(img_byte_arr, format='JPEG')
-                            img_byte_arr.seek(0)
-
-                            return send_file(img_byte_arr, mimetype='image/jpeg', as_attachment=False)
-                    else:
-                        print(f"File not found: {file_path}")
-                        return '', 404
-                except Exception as e:
-                    print(f"Error opening image file: {e}")
+        size = request.args.get('size', DEFAULT_SIZE, type=int)
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({'error': f'size must be one of {list(THUMBNAIL_SIZES)}'}), 400
+
+        # A cached thumbnail is served without a database lookup or opening the original photo
+        thumbnail_path = thumbnail_cache.get(unique_identifier, size)
+        if thumbnail_path is None:
+            with db_manager.get_db() as db:
+                photo = db.query(Photo).filter_by(unique_identifier=unique_identifier).first()
+                if photo is None:
                     return '', 404
-        return '', 404
+                file_path = photo_source_path(photo.file_path, photo.filename)
+            if file_path is None:
+                print(f"No original found under PHOTO_ROOT for {unique_identifier}")
+                return '', 404
+            try:
+                thumbnail_path = thumbnail_cache.get_or_create(unique_identifier, size, file_path)
+            except Exception as e:
+                print(f"Error opening image file: {e}")
+                return '', 404
+
+        # Conditional: ETag and Last-Modified come from the cached file, and a matching request gets a 304
+        return send_file(thumbnail_path, mimetype='image/jpeg', conditional=True, etag=True, max_age=86400)
+
+    def load_contact_sheet(flight_id):
+        """Returns (image path, tile index, format) for the request, or (error response, None, None)."""
+        size = request.args.get('size', DEFAULT_SIZE, type=int)
+        image_format = request.args.get('format', 'jpeg').lower()
+        if size not in CONTACT_SHEET_SIZES or image_format not in CONTACT_SHEET_FORMATS:
+            return (jsonify({'error': f'size must be one of {list(CONTACT_SHEET_SIZES)} and format one of {list(CONTACT_SHEET_FORMATS)}'}), 400), None, None
 
+        with db_manager.get_db() as db:
+            if db.get(Flight, flight_id) is None:
+                return (jsonify({'error': f'Unknown flight {flight_id}'}), 404), None, None
+            rows = db.query(Photo.unique_identifier, Photo.filename, Photo.file_path).filter(Photo.flight_id == flight_id) \
+                .order_by(Photo.create_date, Photo.filename).all()
+        photos = [(unique_identifier or filename, photo_source_path(file_path, filename)) for unique_identifier, filename, file_path in rows]
+
+        try:
+            image_path, index = contact_sheets.get_or_build(flight_id, photos, size, image_format)
+        except ValueError as e:
+            return (jsonify({'error': str(e)}), 400), None, None
+        return image_path, index, image_format
+
+    @app.route('/flights/<int:flight_id>/contact_sheet')
+    def get_contact_sheet(flight_id):
+        # One tiled image of every thumbnail in the flight, in capture order; the tile index says where each one is
+        image_path, index, image_format = load_contact_sheet(flight_id)
+        if index is None:
+            return image_path
+        return send_file(image_path, mimetype=CONTACT_SHEET_FORMATS[image_format][1], etag=index['etag'], conditional=True, max_age=0)
+
+    @app.route('/flights/<int:flight_id>/contact_sheet/index')
+    def get_contact_sheet_index(flight_id):
+        image_path, index, image_format = load_contact_sheet(flight_id)
+        if index is None:
+            return image_path
+        image_url = url_for('get_contact_sheet', flight_id=flight_id, size=index['tile_size'], format=image_format)
+        return jsonify({**index, 'image_url': image_url}), 200
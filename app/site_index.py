@@ -0,0 +1,158 @@
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional, Hashable
+import numpy as np
+from geopy.distance import geodesic
+
+MATCH_RADIUS_FEET = 500
+# Consecutive photos closer than this to the last matched position reuse its match
+SAME_POSITION_FEET = 10
+EARTH_RADIUS_FEET = 20_902_231
+FEET_PER_DEGREE_LATITUDE = 364_000
+
+
+def is_valid_coordinate(lat: Any, lon: Any) -> bool:
+    return (lat is not None and lon is not None and
+            isinstance(lat, (int, float)) and isinstance(lon, (int, float)) and
+            not math.isnan(lat) and not math.isnan(lon) and
+            -90 <= lat <= 90 and -180 <= lon <= 180)
+
+
+def haversine_feet(lat: float, lon: float, site_lats: np.ndarray, site_lons: np.ndarray) -> np.ndarray:
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(site_lats), np.radians(site_lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_FEET * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SiteSpatialIndex:
+    """Grid index over inspection site coordinates for radius-bounded nearest-site queries.
+
+    Sites are bucketed into fixed lat/lon cells. A query only looks at the cells that can hold a
+    site within radius_feet, prefilters those with a vectorized haversine, and runs the exact
+    geodesic solve only for the handful of survivors.
+    """
+
+    CELL_DEGREES = 0.01
+    # Haversine and the WGS-84 geodesic differ by well under 1%, so this never drops a real match
+    PREFILTER_SLACK = 1.01
+    MATRIX_CHUNK = 512
+
+    _cache: 'OrderedDict[Hashable, SiteSpatialIndex]' = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_size = 4
+
+    def __init__(self, inspection_data: List[Dict[str, Any]], radius_feet: float = MATCH_RADIUS_FEET):
+        self.radius_feet = radius_feet
+        positions, lats, lons = [], [], []
+        for site_index, site in enumerate(inspection_data):
+            site_lat, site_lon = site.get('Latitude'), site.get('Longitude')
+            if is_valid_coordinate(site_lat, site_lon):
+                positions.append(site_index)
+                lats.append(float(site_lat))
+                lons.append(float(site_lon))
+
+        self.site_indices = np.array(positions, dtype=np.int64)
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lons = np.array(lons, dtype=np.float64)
+
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        cell_keys = zip(np.floor(self.lats / self.CELL_DEGREES).astype(int), np.floor(self.lons / self.CELL_DEGREES).astype(int))
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for row, key in enumerate(cell_keys):
+            buckets.setdefault(key, []).append(row)
+        self.cells = {key: np.array(rows, dtype=np.int64) for key, rows in buckets.items()}
+
+    @staticmethod
+    def fingerprint(inspection_data: List[Dict[str, Any]]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for site in inspection_data:
+            digest.update(repr((site.get('Site ID'), site.get('Latitude'), site.get('Longitude'))).encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def for_sites(cls, inspection_data: List[Dict[str, Any]], version: Optional[Hashable] = None) -> 'SiteSpatialIndex':
+        """Returns the index for this inspection-data version, building it only the first time it is seen."""
+        key = version if version is not None else cls.fingerprint(inspection_data)
+        with cls._cache_lock:
+            index = cls._cache.get(key)
+            if index is not None:
+                cls._cache.move_to_end(key)
+                return index
+
+        index = cls(inspection_data)
+        with cls._cache_lock:
+            cls._cache[key] = index
+            while len(cls._cache) > cls._cache_size:
+                cls._cache.popitem(last=False)
+        return index
+
+    def candidate_rows(self, lat: float, lon: float) -> np.ndarray:
+        lat_span = self.radius_feet / FEET_PER_DEGREE_LATITUDE
+        lon_span = lat_span / max(math.cos(math.radians(lat)), 0.01)
+        lat_cells = range(math.floor((lat - lat_span) / self.CELL_DEGREES), math.floor((lat + lat_span) / self.CELL_DEGREES) + 1)
+        lon_cells = range(math.floor((lon - lon_span) / self.CELL_DEGREES), math.floor((lon + lon_span) / self.CELL_DEGREES) + 1)
+        rows = [self.cells[key] for key in ((lat_cell, lon_cell) for lat_cell in lat_cells for lon_cell in lon_cells) if key in self.cells]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        # Ascending row order == ascending site order, which keeps the first-listed site winning ties
+        return np.sort(np.concatenate(rows))
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Returns (index into inspection_data, distance in feet) of the nearest site within radius, or (-1, inf)."""
+        rows = self.candidate_rows(lat, lon)
+        if rows.size == 0:
+            return -1, float('inf')
+
+        approximate = haversine_feet(lat, lon, self.lats[rows], self.lons[rows])
+        rows = rows[approximate <= self.radius_feet * self.PREFILTER_SLACK]
+
+        nearest_index, nearest_distance = -1, float('inf')
+        for row in rows:
+            try:
+                distance = geodesic((lat, lon), (self.lats[row], self.lons[row])).feet
+            except ValueError:
+                continue
+            if distance < nearest_distance:
+                nearest_index, nearest_distance = int(self.site_indices[row]), distance
+
+        if nearest_distance > self.radius_feet:
+            return -1, float('inf')
+        return nearest_index, nearest_distance
+
+    def nearest_many(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized nearest() for many points: one haversine matrix over the union of their candidate sites."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        nearest_indices = np.full(len(lats), -1, dtype=np.int64)
+        nearest_distances = np.full(len(lats), np.inf)
+        if len(lats) == 0:
+            return nearest_indices, nearest_distances
+
+        candidate_rows = [self.candidate_rows(lat, lon) for lat, lon in zip(lats, lons)]
+        rows = np.unique(np.concatenate(candidate_rows)) if candidate_rows else np.empty(0, dtype=np.int64)
+        if rows.size == 0:
+            return nearest_indices, nearest_distances
+
+        # Chunked so photos spread over many sites never build one huge points x sites matrix
+        within = np.zeros((len(lats), rows.size), dtype=bool)
+        for start in range(0, len(lats), self.MATRIX_CHUNK):
+            chunk = slice(start, start + self.MATRIX_CHUNK)
+            approximate = haversine_feet(lats[chunk, None], lons[chunk, None], self.lats[rows], self.lons[rows])
+            within[chunk] = approximate <= self.radius_feet * self.PREFILTER_SLACK
+
+        for point in np.flatnonzero(within.any(axis=1)):
+            for row in rows[within[point]]:
+                try:
+                    distance = geodesic((lats[point], lons[point]), (self.lats[row], self.lons[row])).feet
+                except ValueError:
+                    continue
+                if distance < nearest_distances[point]:
+                    nearest_indices[point], nearest_distances[point] = int(self.site_indices[row]), distance
+
+        outside = nearest_distances > self.radius_feet
+        nearest_indices[outside] = -1
+        nearest_distances[outside] = np.inf
+        return nearest_indices, nearest_distances
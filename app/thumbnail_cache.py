@@ -0,0 +1,205 @@
+import os
+import io
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from PIL import Image
+
+DEFAULT_SIZE = 150
+THUMBNAIL_SIZES = (150, 300, 600)
+THUMBNAIL_QUALITY = 85
+
+
+def photo_source_path(file_path: Optional[str], filename: Optional[str]) -> Optional[str]:
+    """Resolves a photo's original file under PHOTO_ROOT, or None if there is no such file.
+
+    Uses the stored file_path, or the file name directly under the root for photos ingested without
+    one. Anything that resolves outside the root is refused: these paths come from uploaded metadata.
+    """
+    photo_root = os.getenv('PHOTO_ROOT')
+    if not photo_root:
+        return None
+    photo_root = os.path.realpath(photo_root)
+    candidate = file_path or (os.path.basename(filename) if filename else None)
+    if not candidate:
+        return None
+    resolved = os.path.realpath(os.path.join(photo_root, candidate))
+    if os.path.commonpath([photo_root, resolved]) != photo_root:
+        print(f"Refusing photo path outside PHOTO_ROOT: {candidate}")
+        return None
+    return resolved if os.path.isfile(resolved) else None
+
+
+def select_preview(img: Image.Image, size: int) -> bool:
+    """Moves img to its embedded preview if it has one at least size pixels on the long side.
+
+    DJI cameras store a reduced copy of the photo as a second image in the MPF (Multi-Picture
+    Format) segment, which exiftool reports as the Preview Image tag; Pillow opens such files as MPO.
+    """
+    for frame in range(1, getattr(img, 'n_frames', 1)):
+        img.seek(frame)
+        if max(img.size) >= size:
+            return True
+    if getattr(img, 'n_frames', 1) > 1:
+        img.seek(0)
+    return False
+
+
+def render_thumbnails(source_path: str, sizes: Iterable[int], use_preview: bool = True) -> Tuple[Dict[int, bytes], bool]:
+    """Decodes the photo once and returns ({size: JPEG bytes} fitting within size x size, whether the preview was used).
+
+    draft() lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, so a 20 MP photo
+    is never expanded to full resolution just to be shrunk to a thumbnail.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    with Image.open(source_path) as img:
+        used_preview = use_preview and select_preview(img, sizes[0])
+        img.draft('RGB', (sizes[0], sizes[0]))
+        img = img.convert('RGB')
+        thumbnails = {}
+        for size in sizes:
+            img.thumbnail((size, size))
+            output = io.BytesIO()
+            img.save(output, format='JPEG', quality=THUMBNAIL_QUALITY)
+            thumbnails[size] = output.getvalue()
+    return thumbnails, used_preview
+
+
+def render_photo(args: Tuple[str, str, List[int]]) -> Tuple[str, Optional[Dict[int, bytes]], bool]:
+    unique_identifier, source_path, sizes = args
+    try:
+        thumbnails, used_preview = render_thumbnails(source_path, sizes)
+    except Exception as e:
+        print(f"Error rendering thumbnails for {source_path}: {e}")
+        return unique_identifier, None, False
+    return unique_identifier, thumbnails, used_preview
+
+
+class ThumbnailCache:
+    """Thumbnails on disk keyed by unique identifier and size, evicted least recently used past max_bytes.
+
+    Use order is the file's atime, set on every hit, so it survives restarts and is shared by every
+    worker process using the same directory. The mtime stays the render time and backs Last-Modified.
+    """
+
+    _default: Optional['ThumbnailCache'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: Optional['OrderedDict[str, int]'] = None
+        self.total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def default(cls) -> 'ThumbnailCache':
+        """The process-wide cache, configured from THUMBNAIL_CACHE_DIR and THUMBNAIL_CACHE_MAX_BYTES."""
+        with cls._default_lock:
+            if cls._default is None:
+                directory = os.getenv('THUMBNAIL_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'spotcheck_thumbnails'))
+                cls._default = cls(directory, int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', str(512 * 1024 * 1024))))
+            return cls._default
+
+    def path(self, unique_identifier: str, size: int) -> str:
+        # Identifiers come from photo metadata, so they are hashed rather than used as file names
+        key = hashlib.blake2b(str(unique_identifier).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}_{size}.jpg")
+
+    def load_entries(self) -> None:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.jpg'):
+                    file_path = os.path.join(root, name)
+                    try:
+                        stat_result = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat_result.st_atime_ns, file_path, stat_result.st_size))
+        self.entries = OrderedDict((file_path, file_size) for _, file_path, file_size in sorted(files))
+        self.total_bytes = sum(self.entries.values())
+
+    def get(self, unique_identifier: str, size: int) -> Optional[str]:
+        """Returns the cached thumbnail's path and marks it as recently used, or None."""
+        file_path = self.path(unique_identifier, size)
+        try:
+            os.utime(file_path, ns=(time.time_ns(), os.stat(file_path).st_mtime_ns))
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            if self.entries is not None and file_path in self.entries:
+                self.entries.move_to_end(file_path)
+        return file_path
+
+    def put(self, unique_identifier: str, size: int, data: bytes) -> str:
+        file_path = self.path(unique_identifier, size)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Written under a temporary name so readers in other processes never see half a file
+        temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+        with os.fdopen(temp_fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+
+        with self.lock:
+            if self.entries is None:
+                self.load_entries()
+            else:
+                self.total_bytes -= self.entries.pop(file_path, 0)
+                self.entries[file_path] = len(data)
+                self.total_bytes += len(data)
+            self.evict()
+        return file_path
+
+    def evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            file_path, file_size = self.entries.popitem(last=False)
+            self.total_bytes -= file_size
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def get_or_create(self, unique_identifier: str, size: int, source_path: str) -> str:
+        """Returns the thumbnail's path, rendering it from source_path on a miss."""
+        file_path = self.get(unique_identifier, size)
+        if file_path is not None:
+            return file_path
+        if photo_source_path(source_path, None) is None:
+            raise ValueError(f"{source_path} is not a photo under PHOTO_ROOT")
+        thumbnails, _ = render_thumbnails(source_path, [size])
+        return self.put(unique_identifier, size, thumbnails[size])
+
+    def pregenerate(self, photos: List[Tuple[str, str]], sizes: Iterable[int] = THUMBNAIL_SIZES, max_workers: Optional[int] = None) -> Dict[str, int]:
+        """Renders every missing size for each (unique_identifier, source_path) in a process pool.
+
+        Each photo is decoded once for all of its sizes. Workers only return the JPEG bytes;
+        this process writes them so the size accounting stays in one place. Paths outside
+        PHOTO_ROOT are skipped.
+        """
+        sizes = list(sizes)
+        work = []
+        for unique_identifier, source_path in photos:
+            missing_sizes = [size for size in sizes if not os.path.exists(self.path(unique_identifier, size))]
+            source_path = photo_source_path(source_path, None) if missing_sizes else None
+            if source_path:
+                work.append((unique_identifier, source_path, missing_sizes))
+
+        counts = {'rendered': 0, 'from_preview': 0, 'failed': 0, 'skipped': len(photos) - len(work)}
+        if not work:
+            return counts
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for unique_identifier, thumbnails, used_preview in executor.map(render_photo, work, chunksize=4):
+                if thumbnails is None:
+                    counts['failed'] += 1
+                    continue
+                for size, data in thumbnails.items():
+                    self.put(unique_identifier, size, data)
+                counts['rendered'] += 1
+                counts['from_preview'] += int(used_preview)
+        return counts
@@ -3,6 +3,7 @@ import pandas as pd
 import pickle
 from typing import List, Tuple, Dict, Any
 from .data_export import export_to_excel
+from .metadata_store import PhotoMetadataStore
 from sqlalchemy.orm import joinedload
 from .flight_models import SiteInspection
 import json
@@ -115,8 +116,11 @@ class Utilities:
     def load_data_from_pickle(passfail_data_path: str, flight_data_path: str) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
         with open(passfail_data_path, 'rb') as f:
             passfail_data = pickle.load(f)
-        with open(flight_data_path, 'rb') as f:
-            flight_data = pickle.load(f)
+        if flight_data_path.endswith('.parquet'):
+            flight_data = PhotoMetadataStore.read_dataframe(flight_data_path)
+        else:
+            with open(flight_data_path, 'rb') as f:
+                flight_data = pickle.load(f)
         return passfail_data, flight_data
 
 
@@ -149,7 +153,7 @@ def create_inspection_dict(inspection):
                 "created_at": flight.created_at.isoformat() if flight.created_at else None,
                 "is_captured": flight.is_captured,
                 "analysis": flight.analysis.to_dict() if flight.analysis else None,
-                'unique identifiers in flight': [photo.filename for photo in flight.photos],  # unique identifier
+                'unique identifiers in flight': [photo.unique_identifier or photo.filename for photo in flight.photos],  # unique identifier
                 "photo_count": len(flight.photos)
             } for flight in site.flights] if site.flights else []
         } for site in inspection.sites] if inspection.sites else []
@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from app.db_sync import DatabaseSyncEngine, LocalStorageBackend, SyncConflictError
+
+
+def write_rows(path, *values):
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS items (value TEXT)")
+        connection.executemany("INSERT INTO items VALUES (?)", [(value,) for value in values])
+    connection.close()
+
+
+def read_rows(path):
+    connection = sqlite3.connect(path)
+    rows = [value for value, in connection.execute("SELECT value FROM items ORDER BY rowid")]
+    connection.close()
+    return rows
+
+
+def make_engine(backend, path):
+    # Small chunks so a few rows span several of them
+    engine = DatabaseSyncEngine(backend, 'test.db', str(path), chunk_bytes=4096)
+    engine.GC_INTERVAL_SECONDS = 0
+    engine.GC_GRACE_SECONDS = 0
+    return engine
+
+
+def referenced_chunks(backend, engine):
+    manifests = [engine.manifest_name] + list(backend.list(engine.conflict_prefix))
+    return {chunk_id for name in manifests for chunk_id in json.loads(backend.read(name)[0])['chunks']}
+
+
+def stored_chunks(backend, engine):
+    return {name[len(engine.chunk_prefix):] for name in backend.list(engine.chunk_prefix)}
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path / 'remote'))
+
+
+def test_checkpoint_and_pull_round_trip(backend, tmp_path):
+    writer = make_engine(backend, tmp_path / 'writer.db')
+    write_rows(writer.local_path, *[f"row {i}" * 20 for i in range(200)])
+    assert writer.checkpoint()
+    assert not writer.checkpoint()
+
+    reader = make_engine(backend, tmp_path / 'reader.db')
+    reader.pull()
+    assert read_rows(reader.local_path) == read_rows(writer.local_path)
+
+    # Only the chunks holding the new rows are uploaded again
+    write_rows(writer.local_path, 'one more')
+    assert writer.checkpoint()
+    assert 0 < writer.last_upload_bytes < json.loads(backend.read(writer.manifest_name)[0])['size']
+
+    reader.pull()
+    assert read_rows(reader.local_path)[-1] == 'one more'
+
+
+def test_conflict_keeps_a_copy_until_resolved(backend, tmp_path):
+    first = make_engine(backend, tmp_path / 'first.db')
+    write_rows(first.local_path, 'base')
+    first.checkpoint()
+    second = make_engine(backend, tmp_path / 'second.db')
+    second.pull()
+
+    write_rows(second.local_path, 'from second')
+    assert second.checkpoint()
+    write_rows(first.local_path, 'from first')
+    with pytest.raises(SyncConflictError):
+        first.checkpoint()
+
+    conflict_names = list(backend.list(first.conflict_prefix))
+    assert len(conflict_names) == 1
+    conflict_manifest = json.loads(backend.read(conflict_names[0])[0])
+    assert set(conflict_manifest['chunks']) <= stored_chunks(backend, first)
+    # Retried on every checkpoint, and still reported while nothing changed
+    with pytest.raises(SyncConflictError):
+        first.checkpoint()
+
+    first.resolve_conflict(keep_local=True)
+    second.pull()
+    assert read_rows(second.local_path) == ['base', 'from first']
+
+    write_rows(first.local_path, 'after resolving')
+    assert first.checkpoint()
+    second.pull()
+    assert read_rows(second.local_path)[-1] == 'after resolving'
+
+
+def test_garbage_collection_keeps_only_referenced_chunks(backend, tmp_path):
+    first = make_engine(backend, tmp_path / 'first.db')
+    write_rows(first.local_path, *[f"row {i}" * 20 for i in range(200)])
+    first.checkpoint()
+    second = make_engine(backend, tmp_path / 'second.db')
+    second.pull()
+
+    # A conflict copy from second, whose chunks must survive collection
+    write_rows(first.local_path, 'from first')
+    first.checkpoint()
+    write_rows(second.local_path, *[f"conflicting {i}" * 20 for i in range(50)])
+    with pytest.raises(SyncConflictError):
+        second.checkpoint()
+
+    for batch in range(3):
+        connection = sqlite3.connect(first.local_path)
+        with connection:
+            connection.execute("UPDATE items SET value = value || ?", (str(batch),))
+        connection.close()
+        time.sleep(0.01)
+        assert first.checkpoint()
+
+    assert stored_chunks(backend, first) == referenced_chunks(backend, first)
+    restored = make_engine(backend, tmp_path / 'restored.db')
+    restored.pull()
+    assert read_rows(restored.local_path) == read_rows(first.local_path)
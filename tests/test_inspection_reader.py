@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.inspection_reader import InspectionDataReader, LocalInspectionDataBackend
+
+
+def write_sheet(directory, name, records, generation):
+    path = os.path.join(directory, name)
+    pd.DataFrame(records).to_excel(path, index=False)
+    # The local backend uses the mtime as the generation
+    os.utime(path, ns=(generation, generation))
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = LocalInspectionDataBackend(str(tmp_path))
+    InspectionDataReader.set_backend(backend)
+    yield backend
+    InspectionDataReader.set_backend(None)
+
+
+def test_snapshot_is_reused_within_the_ttl(backend, monkeypatch):
+    monkeypatch.setattr(InspectionDataReader, 'cache_ttl_seconds', 3600)
+    write_sheet(backend.directory, 'sites.xlsx', [{'Site ID': 1, 'Name': 'first'}], 1_000_000_000)
+    snapshot = InspectionDataReader.read_inspection_snapshot()
+    assert snapshot.lookup(1, 'Name') == 'first'
+
+    write_sheet(backend.directory, 'sites.xlsx', [{'Site ID': 1, 'Name': 'second'}], 2_000_000_000)
+    assert InspectionDataReader.read_inspection_snapshot() is snapshot
+
+
+def test_snapshot_is_reloaded_only_when_the_generation_changes(backend, monkeypatch):
+    monkeypatch.setattr(InspectionDataReader, 'cache_ttl_seconds', 0)
+    write_sheet(backend.directory, 'sites.xlsx', [{'Site ID': 1, 'Name': 'first'}], 1_000_000_000)
+    snapshot = InspectionDataReader.read_inspection_snapshot()
+    assert InspectionDataReader.read_inspection_snapshot() is snapshot
+
+    write_sheet(backend.directory, 'sites.xlsx', [{'Site ID': 1, 'Name': 'second'}], 2_000_000_000)
+    reloaded = InspectionDataReader.read_inspection_snapshot()
+    assert reloaded is not snapshot
+    assert reloaded.version == ('sites.xlsx', 2_000_000_000)
+    assert reloaded.lookup(1, 'Name') == 'second'
+
+    # The newest spreadsheet wins
+    write_sheet(backend.directory, 'newer.xlsx', [{'Site ID': 2, 'Name': 'third'}], 3_000_000_000)
+    assert InspectionDataReader.read_inspection_snapshot().lookup(2, 'Name') == 'third'
+
+
+def test_cached_versions_are_filled_in_the_background(backend, monkeypatch):
+    monkeypatch.setattr(InspectionDataReader, 'cache_ttl_seconds', 3600)
+    write_sheet(backend.directory, 'sites.xlsx', [{'Site ID': 1, 'Name': 'first'}], 1_000_000_000)
+    assert InspectionDataReader.cached_versions() is None
+
+    InspectionDataReader._versions_refresh.join()
+    inspection_data_version, flight_requirements_version = InspectionDataReader.cached_versions()
+    assert inspection_data_version == ('sites.xlsx', 1_000_000_000)
+    assert flight_requirements_version
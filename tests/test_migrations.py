@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine
+from app.flight_models import Base
+from app.migrations import HOT_QUERIES, check_query_plans, run_migrations
+
+
+def test_hot_queries_use_their_indexes(tmp_path):
+    # Built the way an old deployment's database was (tables only), so the indexes come from the migrations
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            table.create(connection)
+            for index in table.indexes:
+                index.drop(connection)
+    run_migrations(engine)
+    failures = check_query_plans(engine)
+    engine.dispose()
+
+    assert HOT_QUERIES
+    assert failures == [], "\n".join(f"Not using its index: {description}: {plan}" for description, plan in failures)